@@ -0,0 +1,99 @@
+""" Synthetic datasets for the benchmarks, derived from the Popolo schemas and
+the mappings in the test fixtures. """
+import os
+import csv
+import json
+import random
+
+from jsonschema import RefResolver
+
+fixtures_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                            'tests', 'fixtures')
+BASE_URI = 'http://www.popoloproject.com/schemas'
+PERSON_URI = BASE_URI + '/person.json#'
+
+
+def fixture_path(path):
+    return os.path.join(fixtures_dir, path)
+
+
+def load_fixture(path):
+    with open(fixture_path(path), 'r') as fh:
+        return json.load(fh)
+
+
+def create_resolver():
+    """ Build a resolver holding the Popolo schemas from the fixtures. """
+    resolver = RefResolver(BASE_URI, BASE_URI)
+    schemas = fixture_path('schemas')
+    for fn in os.listdir(schemas):
+        data = load_fixture(os.path.join('schemas', fn))
+        resolver.store[data.get('id')] = data
+    return resolver
+
+
+def fixture_mapping(resolver, path):
+    """ Load a mapping from the fixtures and register it with the resolver,
+    returning the mapping and its URI. """
+    mapping = load_fixture(path)
+    uri = 'file://' + fixture_path(path)
+    resolver.store[uri] = mapping
+    return mapping, uri
+
+
+def read_rows(path):
+    with open(fixture_path(path), 'r') as fh:
+        return list(csv.DictReader(fh))
+
+
+def sample_rows(path, count, unique=('id',), seed=23):
+    """ Generate ``count`` rows by sampling a fixture CSV file. The columns
+    in ``unique`` are made distinct for each generated row, while all other
+    values repeat as they would in real data. """
+    source = read_rows(path)
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = dict(rnd.choice(source))
+        for column in unique:
+            row[column] = '%s-%s' % (row.get(column) or column, i)
+        rows.append(row)
+    return rows
+
+
+def synthetic_schema(width, depth):
+    """ An object schema with ``width`` string properties per level, nested
+    ``depth`` levels deep through a ``child`` property. """
+    schema = {'type': 'object', 'properties': {}}
+    for i in range(width):
+        schema['properties']['field_%s' % i] = {'type': 'string'}
+    if depth > 1:
+        schema['properties']['child'] = synthetic_schema(width, depth - 1)
+    return schema
+
+
+def synthetic_mapping(width, depth, level=0):
+    """ A mapping for ``synthetic_schema`` which reads one column for each
+    property, named by level and position. """
+    mapping = {'mapping': {}}
+    if level == 0:
+        mapping['schema'] = synthetic_schema(width, depth)
+    for i in range(width):
+        mapping['mapping']['field_%s' % i] = {
+            'column': 'c%s_%s' % (level, i),
+            'transforms': ['strip']
+        }
+    if depth > 1:
+        mapping['mapping']['child'] = synthetic_mapping(width, depth - 1,
+                                                        level=level + 1)
+    return mapping
+
+
+def synthetic_rows(width, depth, count, seed=23):
+    """ Rows to match ``synthetic_mapping``. """
+    rnd = random.Random(seed)
+    words = ['alpha', 'beta', ' gamma', 'delta ', 'epsilon', 'zeta']
+    columns = ['c%s_%s' % (level, i) for level in range(depth)
+               for i in range(width)]
+    return [dict((c, rnd.choice(words)) for c in columns)
+            for _ in range(count)]
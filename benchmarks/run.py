@@ -0,0 +1,267 @@
+""" Throughput benchmarks for the mapper, the statements visitor, the network
+builder and the ElasticSearch mapping generator.
+
+Run with ``python -m benchmarks.run``; see ``--help`` for the options. The
+results are saved as JSON and can be compared to an earlier run with
+``--compare``. """
+from __future__ import print_function
+
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import argparse
+from collections import OrderedDict
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+from jsonmapping import Mapper, StatementsVisitor, Network
+from jsonmapping.elastic import generate_schema_mapping
+
+from benchmarks import data
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """ Register a benchmark. The decorated function is given the options and
+    returns a tuple of the number of units processed per run and a function
+    that performs one run. """
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def everypol_objects(options, resolver):
+    mapping, _ = data.fixture_mapping(resolver, 'everypol/mapping.json')
+    rows = data.sample_rows('everypol/term-26.csv', options.rows)
+    return list(Mapper.apply_iter(rows, mapping, resolver))
+
+
+@benchmark('mapper.everypol')
+def bench_mapper_everypol(options):
+    resolver = data.create_resolver()
+    mapping, _ = data.fixture_mapping(resolver, 'everypol/mapping.json')
+    rows = data.sample_rows('everypol/term-26.csv', options.rows)
+
+    def run():
+        for _ in Mapper.apply_iter(rows, mapping, resolver):
+            pass
+    return len(rows), run
+
+
+@benchmark('mapper.countries')
+def bench_mapper_countries(options):
+    resolver = data.create_resolver()
+    mapping, uri = data.fixture_mapping(resolver, 'countries/mapping.json')
+    rows = data.sample_rows('countries/countries.csv', options.rows,
+                            unique=('iso2', 'iso3'))
+
+    def run():
+        for _ in Mapper.apply_iter(rows, mapping, resolver, scope=uri):
+            pass
+    return len(rows), run
+
+
+@benchmark('mapper.synthetic')
+def bench_mapper_synthetic(options):
+    resolver = data.create_resolver()
+    mapping = data.synthetic_mapping(options.width, options.depth)
+    rows = data.synthetic_rows(options.width, options.depth, options.rows)
+
+    def run():
+        for _ in Mapper.apply_iter(rows, mapping, resolver):
+            pass
+    return len(rows), run
+
+
+@benchmark('statements.triplify')
+def bench_triplify(options):
+    resolver = data.create_resolver()
+    objects = everypol_objects(options, resolver)
+    visitor = StatementsVisitor({'$ref': data.PERSON_URI}, resolver)
+
+    def run():
+        for obj in objects:
+            for _ in visitor.triplify(obj):
+                pass
+    return len(objects), run
+
+
+@benchmark('statements.objectify')
+def bench_objectify(options):
+    resolver = data.create_resolver()
+    objects = everypol_objects(options, resolver)
+    visitor = StatementsVisitor({'$ref': data.PERSON_URI}, resolver)
+    subjects = {}
+    for obj in objects:
+        for (s, p, o, t) in visitor.triplify(obj):
+            subjects.setdefault(s, []).append({
+                'subject': s,
+                'predicate': p,
+                'object': o,
+                'type': t,
+                'source': 'benchmark'
+            })
+
+    def load(subject):
+        return subjects.get(subject, [])
+
+    def run():
+        for obj in objects:
+            visitor.objectify(load, obj['id'], depth=options.depth)
+    return len(objects), run
+
+
+@benchmark('network.add')
+def bench_network(options):
+    resolver = data.create_resolver()
+    objects = everypol_objects(options, resolver)
+
+    def run():
+        network = Network(resolver)
+        for obj in objects:
+            network.add(obj)
+    return len(objects), run
+
+
+@benchmark('elastic.mapping')
+def bench_elastic(options):
+    resolver = data.create_resolver()
+
+    def run():
+        generate_schema_mapping(resolver, data.PERSON_URI,
+                                depth=options.depth)
+    return 1, run
+
+
+def measure(units, run, repeat):
+    """ Time the best of ``repeat`` runs, then do one more run to trace the
+    peak memory use and the number of memory blocks retained after the run.
+    This is a net count: ``tracemalloc`` does not count allocations. """
+    seconds = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.time()
+        run()
+        elapsed = time.time() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+    result = OrderedDict([
+        ('units', units),
+        ('seconds', seconds),
+        ('rate', units / seconds if seconds else None)
+    ])
+    if tracemalloc is not None:
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        gc.collect()
+        result['peak_memory'] = peak
+        result['retained_blocks'] = sys.getallocatedblocks() - blocks
+    return result
+
+
+def default_label():
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('jsonmapping').version
+    except Exception:
+        return 'dev'
+
+
+def compare(results, baseline, threshold):
+    """ Print the change in throughput against a saved baseline and return
+    the names of benchmarks which got slower by more than ``threshold``. """
+    regressions = []
+    print('\n%-24s %14s %14s %8s' % ('benchmark', baseline['label'],
+                                     results['label'], 'change'))
+    for name, result in results['benchmarks'].items():
+        before = baseline['benchmarks'].get(name)
+        if before is None or not before['rate'] or not result['rate']:
+            continue
+        change = result['rate'] / before['rate'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = ' !'
+            regressions.append(name)
+        print('%-24s %14.1f %14.1f %+7.1f%%%s' % (name, before['rate'],
+                                                  result['rate'],
+                                                  change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('names', nargs='*', help='benchmarks to run: %s' %
+                        ', '.join(BENCHMARKS.keys()))
+    parser.add_argument('--rows', type=int, default=2000,
+                        help='number of generated source rows')
+    parser.add_argument('--width', type=int, default=20,
+                        help='properties per level of the synthetic mapping')
+    parser.add_argument('--depth', type=int, default=2,
+                        help='nesting depth of the synthetic mapping, the '
+                             'objectify depth and the ElasticSearch depth')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed runs, the best is reported')
+    parser.add_argument('--label', default=default_label(),
+                        help='name of this run, e.g. the version')
+    parser.add_argument('--output', help='where to save the results '
+                        '(default: benchmarks/results/<label>.json)')
+    parser.add_argument('--compare', help='results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown reported as a regression')
+    options = parser.parse_args(argv)
+    for name in options.names:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark: %s' % name)
+
+    results = OrderedDict([
+        ('label', options.label),
+        ('python', platform.python_version()),
+        ('options', {
+            'rows': options.rows,
+            'width': options.width,
+            'depth': options.depth,
+            'repeat': options.repeat
+        }),
+        ('benchmarks', OrderedDict())
+    ])
+    for name, setup in BENCHMARKS.items():
+        if len(options.names) and name not in options.names:
+            continue
+        units, run = setup(options)
+        result = measure(units, run, options.repeat)
+        results['benchmarks'][name] = result
+        print('%-24s %12.1f units/s  %10s bytes peak' % (
+            name, result['rate'] or 0, result.get('peak_memory', '-')))
+
+    output = options.output
+    if output is None:
+        if not os.path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        output = os.path.join(RESULTS_DIR, '%s.json' % options.label)
+    with open(output, 'w') as fh:
+        json.dump(results, fh, indent=2)
+    print('Saved results to %s' % output)
+
+    if options.compare:
+        with open(options.compare, 'r') as fh:
+            baseline = json.load(fh)
+        if len(compare(results, baseline, options.threshold)):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
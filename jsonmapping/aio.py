@@ -0,0 +1,88 @@
+""" Support for asyncio. This module requires Python 3.6 or later (3.7 for
+process executors, see ``ASYNC_SUPPORTED``) and is only imported when one
+of its functions is used. """
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from jsonmapping.parallel import resolver_state, _init_mapper, _map_chunk
+
+
+async def objectify_many(visitor, load_many, nodes, depth=2):
+    """ Like ``StatementsVisitor.objectify_many``, with a ``load_many`` which
+    returns an awaitable. The loader is awaited once per level of depth. """
+    statements = {}
+    planner = visitor._plan_loads(nodes, depth, statements)
+    try:
+        subjects = next(planner)
+        while True:
+            subjects = planner.send(await load_many(subjects))
+    except StopIteration:
+        pass
+    return visitor._objectify_loaded(statements, nodes, depth)
+
+
+async def objectify(visitor, load_many, node, depth=2):
+    """ Like ``objectify_many``, for a single ``node``. """
+    objs = await objectify_many(visitor, load_many, [node], depth=depth)
+    return objs[0]
+
+
+def _apply_batch(compiled, rows):
+    return list(compiled.apply_iter(rows))
+
+
+async def _iter_batches(rows, size):
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if len(batch):
+        yield batch
+
+
+async def apply_aiter(cls, rows, mapping, resolver, scope=None, validate=True,
+                      batch_size=500, max_pending=2, executor=None):
+    """ Like ``Mapper.apply_iter`` for an async iterator of ``rows``, see
+    ``Mapper.apply_aiter``. """
+    try:
+        loop = asyncio.get_running_loop()
+    except AttributeError:  # Python 3.6
+        loop = asyncio.get_event_loop()
+    mapper = cls(mapping, resolver, scope=scope, validate=validate)
+    compiled = mapper.compile()
+    own_executor = None
+    func, args = _apply_batch, (compiled,)
+    if executor == 'thread':
+        executor = own_executor = ThreadPoolExecutor(max_pending)
+    elif executor == 'process':
+        # The compiled plan cannot be pickled, so each worker builds its own.
+        executor = own_executor = ProcessPoolExecutor(
+            max_pending, initializer=_init_mapper,
+            initargs=(cls, mapping, resolver_state(resolver), scope))
+        func, args = _map_chunk, ()
+
+    pending = deque()
+    try:
+        async for batch in _iter_batches(rows, batch_size):
+            if executor is None:
+                for data in compiled.apply_iter(batch):
+                    yield data
+                # Let other tasks run between batches:
+                await asyncio.sleep(0)
+                continue
+            pending.append(loop.run_in_executor(executor, func,
+                                                *(args + (batch,))))
+            while len(pending) >= max_pending:
+                for data in await pending.popleft():
+                    yield data
+        while len(pending):
+            for data in await pending.popleft():
+                yield data
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor is not None:
+            own_executor.shutdown(wait=False)
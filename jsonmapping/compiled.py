@@ -0,0 +1,321 @@
+from decimal import Decimal
+from datetime import date, datetime
+from json.encoder import encode_basestring_ascii
+
+import six
+
+from jsonmapping.value import compile_value, compile_column
+from jsonmapping.util import ExactEncoder
+
+# Number of JSON fragments collected before ``dump_iter`` writes a block.
+BUFFER_SIZE = 16 * 1024
+# Used for values which have no fast path below, e.g. lists.
+encoder = ExactEncoder()
+
+
+def _encode_date(value):
+    return '"%s"' % value.isoformat()
+
+
+def _encode_decimal(value):
+    if value.is_finite():
+        return str(value)
+    return _encode_other(value)
+
+
+def _encode_other(value):
+    return encoder.encode(value)
+
+
+VALUE_ENCODERS = {
+    type(None): lambda value: 'null',
+    bool: lambda value: 'true' if value else 'false',
+    date: _encode_date,
+    datetime: _encode_date,
+    Decimal: _encode_decimal
+}
+for type_ in set([str, six.text_type]):
+    VALUE_ENCODERS[type_] = encode_basestring_ascii
+for type_ in six.integer_types:
+    VALUE_ENCODERS[type_] = str
+
+
+def encode_value(value):
+    """ Encode a mapped value as JSON, escaped to ASCII. """
+    return VALUE_ENCODERS.get(type(value), _encode_other)(value)
+
+
+class ValueStep(object):
+    """ Extract and convert a single value from each row. """
+
+    def __init__(self, mapper, profiler=None, path=''):
+        self.apply = compile_value(mapper.mapping, mapper.visitor,
+                                   profiler=profiler, path=path)
+        self.apply_batch = compile_column(mapper.mapping, mapper.visitor,
+                                          profiler=profiler, path=path)
+
+    def write(self, data, out):
+        empty, value = self.apply(data)
+        out.append(VALUE_ENCODERS.get(type(value), _encode_other)(value))
+        return empty
+
+
+class ArrayStep(object):
+    """ Wrap the result of the item mapping in a list. """
+
+    def __init__(self, mapper, profiler=None, path=''):
+        self.child = compile_step(mapper.children, profiler=profiler,
+                                  path=path)
+
+    def apply(self, data):
+        empty, value = self.child.apply(data)
+        return empty, [value]
+
+    def apply_batch(self, data, size):
+        return [(empty, [value]) for (empty, value)
+                in self.child.apply_batch(data, size)]
+
+    def write(self, data, out):
+        out.append('[')
+        empty = self.child.write(data, out)
+        out.append(']')
+        return empty
+
+
+class ObjectStep(object):
+    """ Build an object from a flat list of pre-resolved child steps, each a
+    tuple of ``(name, is_array, optional, path, apply)``.
+
+    For ``write``, the children are grouped by name: array children with the
+    same name are written as one array, while other names which occur more
+    than once are resolved like in ``apply`` and encoded as a whole. """
+
+    def __init__(self, mapper, profiler=None, path=''):
+        # Only the root object gets a ``$schema``, even if its path is None.
+        self.root = mapper.visitor.parent is None
+        self.schema = mapper.visitor.path
+        self.skipped = profiler.skipped if profiler is not None else None
+        self.steps = []
+        self.children = []
+        self.writes = []
+        names = [c.visitor.name for c in mapper.children]
+        for i, child in enumerate(mapper.children):
+            name = child.visitor.name
+            child_path = name if not path else '%s/%s' % (path, name)
+            if names.count(name) > 1:
+                child_path += '[%s]' % names[:i].count(name)
+            step = compile_step(child, profiler=profiler, path=child_path)
+            self.children.append(step)
+            self.steps.append((name, child.visitor.is_array, child.optional,
+                               child_path, step.apply))
+
+        self.schema_pair = None
+        if self.root:
+            self.schema_pair = '"$schema":' + encode_value(self.schema)
+        groups = {}
+        for (name, is_array, optional, path, _), step in zip(self.steps,
+                                                             self.children):
+            if name not in groups:
+                groups[name] = (encode_basestring_ascii(name) + ':', [])
+                self.writes.append(groups[name])
+            groups[name][1].append((is_array, optional, path, step))
+
+    def _write_array(self, members, data, out):
+        """ Write the items of all array children of one name into a single
+        array. Returns ``None`` if all of them are skipped, otherwise the
+        empty flag like ``apply``. """
+        items, obj_empty = len(out), True
+        for is_array, optional, path, step in members:
+            mark = len(out)
+            if mark > items:
+                out.append(',')
+            empty = step.child.write(data, out)
+            if empty and optional:
+                del out[mark:]
+                if self.skipped is not None:
+                    self.skipped(path)
+                continue
+            if not empty:
+                obj_empty = False
+        if len(out) == items:
+            return None
+        return obj_empty
+
+    def _write_repeated(self, members, data, out):
+        """ Resolve children which share a name the way ``apply`` does: the
+        last one which is not skipped wins. """
+        found, obj_empty, value = False, True, None
+        for is_array, optional, path, step in members:
+            empty, member_value = step.apply(data)
+            if empty and optional:
+                if self.skipped is not None:
+                    self.skipped(path)
+                continue
+            if not empty:
+                obj_empty = False
+            found, value = True, member_value
+        if not found:
+            return None
+        out.append(encode_value(value))
+        return obj_empty
+
+    def write(self, data, out):
+        """ Append the JSON encoding of the object for ``data`` to the list
+        of string fragments ``out`` and return the empty flag, like
+        ``apply``. Skipped optional branches are written, then truncated
+        away again. """
+        out.append('{')
+        opened = len(out)
+        if self.schema_pair is not None:
+            out.append(self.schema_pair)
+        obj_empty = True
+        for key, members in self.writes:
+            mark = len(out)
+            if mark > opened:
+                out.append(',')
+            out.append(key)
+            if len(members) == 1 and not members[0][0]:
+                _, optional, path, step = members[0]
+                empty = step.write(data, out)
+                if empty and optional:
+                    empty = None
+                    if self.skipped is not None:
+                        self.skipped(path)
+            elif all(m[0] for m in members):
+                out.append('[')
+                empty = self._write_array(members, data, out)
+                out.append(']')
+            else:
+                empty = self._write_repeated(members, data, out)
+            if empty is None:
+                del out[mark:]
+            elif not empty:
+                obj_empty = False
+        out.append('}')
+        return obj_empty
+
+    def apply(self, data):
+        obj = {}
+        if self.root:
+            obj['$schema'] = self.schema
+        obj_empty = True
+        for name, is_array, optional, path, apply in self.steps:
+            empty, value = apply(data)
+            if empty and optional:
+                if self.skipped is not None:
+                    self.skipped(path)
+                continue
+            if not empty:
+                obj_empty = False
+
+            if is_array and name in obj:
+                obj[name].extend(value)
+            else:
+                obj[name] = value
+        return obj_empty, obj
+
+    def apply_batch(self, data, size):
+        columns = []
+        for (name, is_array, optional, path, _), step in zip(self.steps,
+                                                             self.children):
+            columns.append((name, is_array, optional, path,
+                            step.apply_batch(data, size)))
+
+        results = []
+        for i in range(size):
+            obj = {}
+            if self.root:
+                obj['$schema'] = self.schema
+            obj_empty = True
+            for name, is_array, optional, path, column in columns:
+                empty, value = column[i]
+                if empty and optional:
+                    if self.skipped is not None:
+                        self.skipped(path)
+                    continue
+                if not empty:
+                    obj_empty = False
+
+                if is_array and name in obj:
+                    obj[name].extend(value)
+                else:
+                    obj[name] = value
+            results.append((obj_empty, obj))
+        return results
+
+
+def compile_step(mapper, profiler=None, path=''):
+    """ Select the step type matching the visitor of ``mapper``. """
+    if mapper.visitor.is_object:
+        return ObjectStep(mapper, profiler=profiler, path=path)
+    elif mapper.visitor.is_array:
+        return ArrayStep(mapper, profiler=profiler, path=path)
+    return ValueStep(mapper, profiler=profiler, path=path)
+
+
+class CompiledMapper(object):
+    """ A mapper tree which has been resolved into a plan of steps ahead of
+    time. All decisions which ``Mapper.apply`` makes for each row (node types,
+    columns, transforms, formats, defaults and type casts) are taken once when
+    the plan is built; applying it yields the same result as the mapper.
+    With a ``MappingProfiler``, each node of the plan reports to it. """
+
+    def __init__(self, mapper, profiler=None):
+        self.mapper = mapper
+        self.profiler = profiler
+        self.root = compile_step(mapper, profiler=profiler)
+
+    def apply(self, data):
+        """ Apply the plan to ``data``, returning a tuple of the empty flag
+        and the resulting data element, like ``Mapper.apply``. """
+        return self.root.apply(data)
+
+    def apply_batch(self, columns):
+        """ Map a column-oriented batch, i.e. a mapping of column names to
+        equally long sequences of values, and return the list of resulting
+        objects. Record batches offering ``to_pydict()`` are accepted, too. """
+        if hasattr(columns, 'to_pydict'):
+            columns = columns.to_pydict()
+        sizes = set(len(values) for values in columns.values())
+        if len(sizes) > 1:
+            raise ValueError('Columns in a batch must have the same length.')
+        size = sizes.pop() if len(sizes) else 0
+        return [data for (_, data) in self.root.apply_batch(columns, size)]
+
+    def apply_iter(self, rows):
+        """ Apply the plan to each of the given ``rows``. """
+        apply = self.root.apply
+        for row in rows:
+            _, data = apply(row)
+            yield data
+
+    def write(self, data, buf):
+        """ Append the JSON encoding of the object for ``data`` to the
+        bytearray ``buf``, without building the object. Returns the empty
+        flag. """
+        out = []
+        empty = self.root.write(data, out)
+        buf.extend(''.join(out).encode('ascii'))
+        return empty
+
+    def dump_iter(self, rows, sink, buffer_size=BUFFER_SIZE):
+        """ Write each of the ``rows`` to ``sink`` as a line of JSON, and
+        return the number of rows. ``sink`` is either a bytearray, a binary
+        file object or a function which is called with blocks of output,
+        each made of about ``buffer_size`` JSON fragments. """
+        if isinstance(sink, bytearray):
+            flush = sink.extend
+        else:
+            flush = getattr(sink, 'write', sink)
+        write = self.root.write
+        out, count = [], 0
+        for row in rows:
+            write(row, out)
+            out.append('\n')
+            count += 1
+            if len(out) >= buffer_size:
+                flush(''.join(out).encode('ascii'))
+                del out[:]
+        if len(out):
+            flush(''.join(out).encode('ascii'))
+        return count
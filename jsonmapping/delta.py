@@ -0,0 +1,146 @@
+""" Incremental mapping of source tables which change little between runs.
+Each row is fingerprinted over the columns used by the mapping, and the
+fingerprints are kept in a SQLite database. Later runs only map and emit the
+rows which are new or have changed, and report the keys of rows which have
+disappeared. """
+import sqlite3
+
+import six
+
+from jsonmapping.mapper import Mapper
+from jsonmapping.util import content_hash
+from jsonmapping.parallel import iter_chunks
+
+NEW = 'new'
+CHANGED = 'changed'
+DELETED = 'deleted'
+
+# Bump this if the fingerprints are computed differently.
+DELTA_FORMAT = 1
+
+# Older SQLite builds allow at most 999 parameters in a query.
+MAX_VARIABLES = 999
+
+
+def mapping_version(mapper):
+    """ Hash the mapping and the resolved schemas of all nodes it maps to,
+    so that a change to either invalidates all fingerprints. """
+    schemas = []
+    mappers = [mapper]
+    while len(mappers):
+        node = mappers.pop()
+        schemas.append(node.visitor.schema)
+        if node.visitor.is_array:
+            mappers.append(node.children)
+        elif node.visitor.is_object:
+            mappers.extend(node.children)
+    return content_hash(DELTA_FORMAT, mapper.mapping, schemas)
+
+
+class DeltaStore(object):
+    """ The fingerprints of the rows seen in earlier runs, kept in SQLite. """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta '
+                          '(key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS rows '
+                          '(key TEXT PRIMARY KEY, fingerprint TEXT, '
+                          'run INTEGER)')
+        self.conn.commit()
+
+    def get_meta(self, key, default=None):
+        rp = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,))
+        row = rp.fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) '
+                          'VALUES (?, ?)', (key, six.text_type(value)))
+
+    def start(self, version):
+        """ Begin a new run and return its number. If the mapping version
+        changed, all stored fingerprints are discarded, so that every row
+        which still exists is reported as changed. """
+        if self.get_meta('version') != version:
+            self.conn.execute('UPDATE rows SET fingerprint = NULL')
+            self.set_meta('version', version)
+        run = int(self.get_meta('run', 0)) + 1
+        self.set_meta('run', run)
+        return run
+
+    def fingerprints(self, keys):
+        """ Get the stored fingerprints for ``keys``. """
+        fingerprints = {}
+        for batch in iter_chunks(keys, MAX_VARIABLES):
+            query = 'SELECT key, fingerprint FROM rows WHERE key IN (%s)'
+            query = query % ', '.join('?' for _ in batch)
+            fingerprints.update(self.conn.execute(query, batch).fetchall())
+        return fingerprints
+
+    def update(self, run, fingerprints):
+        self.conn.executemany('INSERT OR REPLACE INTO rows '
+                              '(key, fingerprint, run) VALUES (?, ?, ?)',
+                              [(k, f, run) for (k, f) in fingerprints])
+
+    def deleted(self, run):
+        """ Remove and return the keys of the rows not seen in ``run``. """
+        rp = self.conn.execute('SELECT key FROM rows WHERE run < ?', (run,))
+        keys = [key for (key,) in rp.fetchall()]
+        self.conn.execute('DELETE FROM rows WHERE run < ?', (run,))
+        return keys
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+def row_key(row, key):
+    """ Get the identity of a row from one or several key columns. """
+    if isinstance(key, six.string_types):
+        return six.text_type(row.get(key))
+    return u'\x1f'.join(six.text_type(row.get(k)) for k in key)
+
+
+def apply_delta(rows, mapping, resolver, path, key, scope=None,
+                validate=True, chunksize=500):
+    """ Map only the ``rows`` which are new or have changed since the last
+    run against the store at ``path``. ``key`` names the column (or list of
+    columns) which identifies a row. Yields ``(status, key, data)`` tuples,
+    where ``status`` is ``NEW``, ``CHANGED`` or ``DELETED`` (with ``data``
+    set to ``None``). Deleted rows are reported at the end. The store is
+    only updated once all rows have been consumed, so an interrupted run is
+    repeated in full. """
+    mapper = Mapper(mapping, resolver, scope=scope, validate=validate)
+    compiled = mapper.compile()
+    columns = sorted(mapper.columns)
+    store = DeltaStore(path)
+    try:
+        run = store.start(mapping_version(mapper))
+        for chunk in iter_chunks(rows, chunksize):
+            keys = [row_key(row, key) for row in chunk]
+            stored = store.fingerprints(list(set(keys)))
+            updates = []
+            for row_id, row in zip(keys, chunk):
+                fingerprint = content_hash([row.get(c) for c in columns])
+                updates.append((row_id, fingerprint))
+                if row_id in stored and stored[row_id] == fingerprint:
+                    continue
+                status = CHANGED if row_id in stored else NEW
+                stored[row_id] = fingerprint
+                _, data = compiled.apply(row)
+                yield status, row_id, data
+            store.update(run, updates)
+        for row_id in store.deleted(run):
+            yield DELETED, row_id, None
+        store.commit()
+    except BaseException:
+        store.rollback()
+        raise
+    finally:
+        store.close()
@@ -1,13 +1,88 @@
 """ These are utility functions used by the OCCRP datamapper to generate a
-matching ElasticSearch schema, given a JSON Schema descriptor. """
+matching ElasticSearch schema, given a JSON Schema descriptor, and to prepare
+mapped objects for the bulk API. """
+import os
+import re
+import json
+import math
+import tempfile
+from datetime import date, datetime
+
+import six
+
 from jsonmapping.visitor import SchemaVisitor
+from jsonmapping.util import content_hash
+from jsonmapping.util import ExactEncoder
+
+# Bump this if the generated mappings change, to invalidate cached ones.
+MAPPING_FORMAT = 1
+
+# Default limits of a bulk request.
+BULK_MAX_BYTES = 5 * 1024 * 1024
+BULK_MAX_DOCS = 1000
+
+TRUE_VALUES = ('true', 't', 'yes', 'y', '1')
+FALSE_VALUES = ('false', 'f', 'no', 'n', '0', '')
+
+# Dates in the ``dateOptionalTime`` format used by the generated mappings.
+ISO_DATE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})'
+                      r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?'
+                      r'(?:Z|[+-]\d{2}:?\d{2})?)?$')
 
+bulk_encoder = ExactEncoder(separators=(',', ':'))
 
-def generate_schema_mapping(resolver, schema_uri, depth=1):
+
+def generate_schema_mapping(resolver, schema_uri, depth=1, cache_dir=None):
     """ Try and recursively iterate a JSON schema and to generate an ES mapping
-    that encasulates it. """
+    that encasulates it. If ``cache_dir`` is given, the mapping is stored
+    there, keyed by a hash of the schemas in the resolver, and re-used as
+    long as they do not change. """
+    if cache_dir is not None:
+        key = content_hash(MAPPING_FORMAT, schema_uri, depth,
+                           dict(resolver.store))
+        cache_path = os.path.join(cache_dir, 'mapping-%s.json' % key)
+        mapping = _read_cache(cache_path)
+        if mapping is not None:
+            return mapping
+    # Not from the shared visitor registry, which may hold visitors for an
+    # older version of the schemas.
     visitor = SchemaVisitor({'$ref': schema_uri}, resolver)
-    return _generate_schema_mapping(visitor, set(), depth)
+    mapping, _ = _generate_schema_mapping(visitor, set(), depth, {})
+    mapping = _copy_mapping(mapping)
+    if cache_dir is not None:
+        _write_cache(cache_path, mapping)
+    return mapping
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as fh:
+            return json.load(fh)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_cache(cache_path, mapping):
+    """ Write to a temporary file first, so that concurrent readers never see
+    a partial mapping. """
+    cache_dir = os.path.dirname(cache_path)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(mapping, fh)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _copy_mapping(mapping):
+    """ Copy the generated mapping, so that none of its parts are shared. """
+    if isinstance(mapping, dict):
+        return dict((k, _copy_mapping(v)) for (k, v) in mapping.items())
+    return mapping
 
 
 def _generator_field_mapping(visitor):
@@ -26,7 +101,24 @@ def _generator_field_mapping(visitor):
     return mapping
 
 
-def _generate_schema_mapping(visitor, path, depth):
+def _generate_schema_mapping(visitor, path, depth, memo):
+    """ Generate the mapping for ``visitor``, given the schema ``path`` which
+    leads to it (to stop at cycles) and the remaining ``depth``. Returns the
+    mapping and the checks against ``path`` it depends on, as a dict of the
+    checked schema paths to whether they were in ``path``. Mappings are
+    memoized in ``memo`` by visitor path and depth, and re-used wherever the
+    same checks have the same outcome, which also covers the cycles. """
+    key = (visitor.path, depth, visitor.parent is None)
+    for mapping, checks in memo.get(key, []):
+        if all((p in path) == hit for (p, hit) in checks.items()):
+            return mapping, checks
+    mapping, checks = _build_schema_mapping(visitor, path, depth, memo)
+    if visitor.path is not None:
+        memo.setdefault(key, []).append((mapping, checks))
+    return mapping, checks
+
+
+def _build_schema_mapping(visitor, path, depth, memo):
     if visitor.is_object:
         mapping = {
             'type': 'nested',
@@ -38,14 +130,171 @@ def _generate_schema_mapping(visitor, path, depth):
         }
         if not visitor.parent:
             mapping['type'] = 'object'
-        if visitor.path in path or not depth:
-            return mapping
+        if not depth:
+            return mapping, {}
+        checks = {visitor.path: visitor.path in path}
+        if checks[visitor.path]:
+            return mapping, checks
         sub_path = path.union([visitor.path])
         for prop in visitor.properties:
-            prop_mapping = _generate_schema_mapping(prop, sub_path, depth - 1)
+            prop_mapping, prop_checks = _generate_schema_mapping(
+                prop, sub_path, depth - 1, memo)
             mapping['properties'][prop.name] = prop_mapping
-        return mapping
+            for (p, hit) in prop_checks.items():
+                if p != visitor.path:
+                    checks[p] = hit
+        return mapping, checks
     elif visitor.is_array:
-        return _generate_schema_mapping(visitor.items, path, depth - 1)
+        return _generate_schema_mapping(visitor.items, path, depth - 1, memo)
     else:
-        return _generator_field_mapping(visitor)
+        return _generator_field_mapping(visitor), {}
+
+
+def _coerce_long(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, six.integer_types):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+def _coerce_float(value):
+    value = float(value)
+    if math.isinf(value) or math.isnan(value):
+        raise ValueError(value)
+    return value
+
+
+def _coerce_boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, six.string_types):
+        value = value.strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValueError(value)
+    return bool(value)
+
+
+def _coerce_date(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, six.string_types):
+        value = value.strip()
+        match = ISO_DATE.match(value)
+        if match is None:
+            raise ValueError(value)
+        # Check the ranges of the parts, e.g. for a 13th month:
+        datetime(*[int(p) for p in match.groups() if p is not None])
+    return value
+
+
+def _coerce_string(value):
+    if isinstance(value, (six.string_types, dict, list)):
+        return value
+    return six.text_type(value)
+
+
+COERCERS = {
+    'long': _coerce_long,
+    'integer': _coerce_long,
+    'float': _coerce_float,
+    'double': _coerce_float,
+    'boolean': _coerce_boolean,
+    'date': _coerce_date,
+    'string': _coerce_string
+}
+
+
+def document_coercer(mapping):
+    """ Build a function which converts the values of a document to the
+    types declared in an ES ``mapping``. Values in lists are converted one
+    by one, since ES mappings do not distinguish arrays. Values which
+    cannot be converted are set to ``None``, so that a single bad value
+    does not make ES reject the whole document; fields which are not in
+    the mapping are left as they are. """
+    if 'properties' in mapping:
+        fields = dict((name, document_coercer(sub)) for (name, sub)
+                      in mapping['properties'].items())
+
+        def coerce_object(value):
+            if isinstance(value, list):
+                return [coerce_object(v) for v in value]
+            if not isinstance(value, dict):
+                return value
+            doc = {}
+            for name, field_value in value.items():
+                coerce = fields.get(name)
+                if coerce is not None and field_value is not None:
+                    field_value = coerce(field_value)
+                doc[name] = field_value
+            return doc
+        return coerce_object
+
+    convert = COERCERS.get(mapping.get('type'))
+    if convert is None:
+        return lambda value: value
+
+    def coerce_value(value):
+        if isinstance(value, list):
+            return [coerce_value(v) for v in value]
+        try:
+            return convert(value)
+        except (TypeError, ValueError, OverflowError):
+            return None
+    return coerce_value
+
+
+def bulk_batches(objects, mapping, index, doc_type=None, id_field=None,
+                 max_bytes=BULK_MAX_BYTES, max_docs=BULK_MAX_DOCS):
+    """ Turn mapped ``objects`` into bodies for the ES bulk API, as UTF-8
+    encoded bytes holding an ``index`` action line and a document line for
+    each object. A batch is yielded whenever adding the next document would
+    make it larger than ``max_bytes`` or it holds ``max_docs`` documents.
+    Values are coerced to the types declared in ``mapping``, as generated
+    by ``generate_schema_mapping``. The document ID is read from
+    ``id_field``, which defaults to the ``_id`` path of the mapping. """
+    coerce = document_coercer(mapping)
+    if id_field is None:
+        id_field = mapping.get('_id', {}).get('path', 'id')
+    meta = {'_index': index}
+    if doc_type is not None:
+        meta['_type'] = doc_type
+    encode = bulk_encoder.encode
+
+    lines, size = [], 0
+    for obj in objects:
+        doc = coerce(obj)
+        action = dict(meta)
+        if doc.get(id_field) is not None:
+            action['_id'] = doc.get(id_field)
+        line = u'%s\n%s\n' % (encode({'index': action}), encode(doc))
+        line = line.encode('utf-8')
+        if len(lines) and size + len(line) > max_bytes:
+            yield b''.join(lines)
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+        if len(lines) >= max_docs:
+            yield b''.join(lines)
+            lines, size = [], 0
+    if len(lines):
+        yield b''.join(lines)
+
+
+def write_bulk(objects, mapping, index, sink, **kwargs):
+    """ Write the bulk bodies for ``objects`` to ``sink``, which is either a
+    binary file object or a function called with each batch, e.g. to send
+    it to the cluster. Accepts the options of ``bulk_batches`` and returns
+    the number of batches. """
+    write = getattr(sink, 'write', sink)
+    batches = 0
+    for batch in bulk_batches(objects, mapping, index, **kwargs):
+        write(batch)
+        batches += 1
+    return batches
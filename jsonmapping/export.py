@@ -0,0 +1,123 @@
+""" Streaming exporters for networks. Each writer takes a text file object and
+iterables of nodes, as ``(node_id, attrs)`` tuples, and edges, as ``(source,
+target, attrs)`` tuples, and writes them one at a time, so the whole graph is
+never serialized in memory. """
+import csv
+from xml.sax.saxutils import escape, quoteattr
+
+import six
+
+from jsonmapping.util import ExactEncoder
+
+GRAPH_NODE = 'node'
+GRAPH_EDGE = 'edge'
+EDGE_FIELDS = ('source', 'target', 'id', '$schema')
+
+encoder = ExactEncoder()
+
+
+def write_jsonl(fh, nodes, edges):
+    """ Write one JSON object per line for each node and edge, marked by a
+    ``$graph`` key. This format can be appended to. """
+    for node_id, attrs in nodes:
+        data = dict(attrs or {})
+        data.update({'$graph': GRAPH_NODE, 'id': node_id})
+        fh.write(encoder.encode(data))
+        fh.write('\n')
+    for source, target, attrs in edges:
+        data = dict(attrs or {})
+        data.update({'$graph': GRAPH_EDGE, 'source': source,
+                     'target': target})
+        fh.write(encoder.encode(data))
+        fh.write('\n')
+
+
+def write_node_link(fh, nodes, edges):
+    """ Write the node-link JSON format of ``networkx``, with links referring
+    to node IDs. """
+    fh.write('{"directed": false, "multigraph": true, "graph": {}, '
+             '"nodes": [')
+    for i, (node_id, attrs) in enumerate(nodes):
+        data = dict(attrs or {})
+        data['id'] = node_id
+        fh.write(',\n' if i else '\n')
+        fh.write(encoder.encode(data))
+    fh.write('\n], "links": [')
+    for i, (source, target, attrs) in enumerate(edges):
+        data = dict(attrs or {})
+        data.update({'source': source, 'target': target})
+        fh.write(',\n' if i else '\n')
+        fh.write(encoder.encode(data))
+    fh.write('\n]}\n')
+
+
+def attribute_keys(items, position):
+    """ Collect the attribute names used in nodes or edges. """
+    keys = set()
+    for item in items:
+        keys.update((item[position] or {}).keys())
+    return sorted(keys)
+
+
+def _graphml_data(fh, prefix, keys, attrs):
+    for i, key in enumerate(keys):
+        value = (attrs or {}).get(key)
+        if value is None:
+            continue
+        if not isinstance(value, six.string_types):
+            value = encoder.encode(value)
+        fh.write('<data key="%s%s">%s</data>' % (prefix, i, escape(value)))
+
+
+def write_graphml(fh, nodes, edges, node_keys, edge_keys):
+    """ Write GraphML. The attribute names must be declared before the graph,
+    so they need to be given (see ``attribute_keys``). All attributes are
+    written as strings. """
+    fh.write('<?xml version="1.0" encoding="utf-8"?>\n'
+             '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+    for prefix, domain, keys in (('n', 'node', node_keys),
+                                 ('e', 'edge', edge_keys)):
+        for i, key in enumerate(keys):
+            fh.write('<key id="%s%s" for="%s" attr.name=%s '
+                     'attr.type="string"/>\n' % (prefix, i, domain,
+                                                 quoteattr(key)))
+    fh.write('<graph edgedefault="undirected">\n')
+    for node_id, attrs in nodes:
+        fh.write('<node id=%s>' % quoteattr(six.text_type(node_id)))
+        _graphml_data(fh, 'n', node_keys, attrs)
+        fh.write('</node>\n')
+    for source, target, attrs in edges:
+        fh.write('<edge source=%s target=%s>' % (
+            quoteattr(six.text_type(source)),
+            quoteattr(six.text_type(target))))
+        _graphml_data(fh, 'e', edge_keys, attrs)
+        fh.write('</edge>\n')
+    fh.write('</graph>\n</graphml>\n')
+
+
+def _csv_cell(value):
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def write_edge_csv(fh, edges, fields=EDGE_FIELDS, header=True):
+    """ Write a CSV edge list with the given ``fields``, which can name the
+    ``source`` and ``target`` nodes or any edge attribute. On Python 2, the
+    ``csv`` module writes bytes, so text is encoded as UTF-8. """
+    writer = csv.writer(fh)
+    if header:
+        writer.writerow([_csv_cell(f) for f in fields])
+    for source, target, attrs in edges:
+        data = dict(attrs or {})
+        data.update({'source': source, 'target': target})
+        writer.writerow([_csv_cell(data.get(f)) for f in fields])
+
+
+EXPORTERS = {
+    'jsonl': write_jsonl,
+    'node-link': write_node_link,
+    'graphml': write_graphml,
+    'csv': write_edge_csv
+}
+APPEND_ONLY = ('jsonl', 'csv')
@@ -0,0 +1,181 @@
+""" Streaming readers and writers to feed a ``Mapper`` from CSV, TSV and JSON
+Lines sources, and to write mapped objects as JSON Lines. The readers accept
+file names, text or binary file objects and memory-mapped files. """
+from __future__ import absolute_import
+
+import io
+import csv
+import json
+import mmap
+from operator import itemgetter
+
+import six
+
+from jsonmapping.mapper import Mapper
+from jsonmapping.util import json_default  # noqa
+from jsonmapping.util import ExactEncoder
+
+# Read buffer used when opening files by name.
+BUFFER_SIZE = 1024 * 1024
+
+
+def open_text(source, encoding='utf-8', buffer_size=BUFFER_SIZE):
+    """ Turn ``source`` into an iterable of text lines. """
+    if isinstance(source, six.string_types):
+        return io.open(source, 'r', encoding=encoding, newline='',
+                       buffering=buffer_size)
+    if isinstance(source, mmap.mmap):
+        return (line.decode(encoding) for line
+                in iter(source.readline, b''))
+    if isinstance(source.read(0), six.binary_type):
+        if not hasattr(source, 'readable'):
+            # Python 2 file objects cannot be wrapped.
+            return (line.decode(encoding) for line in source)
+        return io.TextIOWrapper(source, encoding=encoding, newline='')
+    return source
+
+
+def open_bytes(source, encoding='utf-8', buffer_size=BUFFER_SIZE):
+    """ Turn ``source`` into an iterable of encoded lines and their
+    encoding, for the ``csv`` module of Python 2. """
+    if isinstance(source, six.string_types):
+        return open(source, 'rb', buffer_size), encoding
+    if isinstance(source, mmap.mmap):
+        return iter(source.readline, b''), encoding
+    if isinstance(source.read(0), six.binary_type):
+        return source, encoding
+    return (line.encode('utf-8') for line in source), 'utf-8'
+
+
+def csv_reader(source, delimiter=',', encoding='utf-8',
+               buffer_size=BUFFER_SIZE):
+    """ Read the rows of a CSV file as lists of text cells. Python 2 can
+    only parse bytes, so the cells are decoded after parsing. """
+    if not six.PY2:
+        return csv.reader(open_text(source, encoding=encoding,
+                                    buffer_size=buffer_size),
+                          delimiter=delimiter)
+    lines, encoding = open_bytes(source, encoding=encoding,
+                                 buffer_size=buffer_size)
+    reader = csv.reader(lines, delimiter=str(delimiter))
+    return ([c.decode(encoding) for c in row] for row in reader)
+
+
+def read_csv(source, columns=None, delimiter=',', encoding='utf-8',
+             reuse=False, buffer_size=BUFFER_SIZE):
+    """ Stream the rows of a CSV file as dicts keyed by the column headers.
+    If ``columns`` is given, only those columns are included in the rows.
+    With ``reuse``, the same dict is updated and yielded for each row; this
+    is only safe if the consumer does not keep rows around. Like
+    ``csv.DictReader``, blank lines are skipped and missing cells are
+    ``None``. """
+    reader = csv_reader(source, delimiter=delimiter, encoding=encoding,
+                        buffer_size=buffer_size)
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = [(n, i) for (i, n) in enumerate(header)
+              if columns is None or n in columns]
+    names = [n for (n, _) in fields]
+    indexes = [i for (_, i) in fields]
+    width = max(indexes) + 1 if len(indexes) else 0
+    if not len(indexes):
+        def getter(values):
+            return ()
+    elif len(indexes) == 1:
+        index = indexes[0]
+
+        def getter(values):
+            return (values[index],)
+    else:
+        getter = itemgetter(*indexes)
+
+    row = {}
+    for values in reader:
+        if not len(values):
+            continue
+        if len(values) >= width:
+            cells = zip(names, getter(values))
+        else:
+            cells = [(n, values[i] if i < len(values) else None)
+                     for (n, i) in fields]
+        if reuse:
+            row.update(cells)
+            yield row
+        else:
+            yield dict(cells)
+
+
+def read_tsv(source, columns=None, encoding='utf-8', reuse=False,
+             buffer_size=BUFFER_SIZE):
+    """ Stream the rows of a tab-separated file, see ``read_csv``. """
+    return read_csv(source, columns=columns, delimiter='\t',
+                    encoding=encoding, reuse=reuse, buffer_size=buffer_size)
+
+
+def read_jsonl(source, encoding='utf-8', buffer_size=BUFFER_SIZE):
+    """ Stream the objects in a JSON Lines file, skipping blank lines. """
+    for line in open_text(source, encoding=encoding,
+                          buffer_size=buffer_size):
+        line = line.strip()
+        if len(line):
+            yield json.loads(line)
+
+
+def map_csv(source, mapping, resolver, scope=None, delimiter=',',
+            encoding='utf-8', validate=True):
+    """ Map the rows of a CSV file, reading only the columns which are used
+    by the mapping. """
+    mapper = Mapper(mapping, resolver, scope=scope, validate=validate)
+    rows = read_csv(source, columns=mapper.columns, delimiter=delimiter,
+                    encoding=encoding, reuse=True)
+    return mapper.compile().apply_iter(rows)
+
+
+def map_jsonl(source, mapping, resolver, scope=None, encoding='utf-8',
+              validate=True):
+    """ Map the objects in a JSON Lines file. """
+    mapper = Mapper(mapping, resolver, scope=scope, validate=validate)
+    return mapper.compile().apply_iter(read_jsonl(source, encoding=encoding))
+
+
+class JSONLinesWriter(object):
+    """ Write objects to a text or binary file object as JSON Lines. Lines
+    are buffered and written in blocks of ``buffer_lines``. """
+
+    def __init__(self, fileobj, buffer_lines=1000, encoding='utf-8'):
+        self.fileobj = fileobj
+        self.buffer_lines = buffer_lines
+        self.encoding = encoding
+        self.binary = isinstance(fileobj, io.BufferedIOBase) or \
+            'b' in getattr(fileobj, 'mode', '')
+        self.encoder = ExactEncoder(separators=(',', ':'))
+        self.buffer = []
+
+    def write(self, obj):
+        self.buffer.append(self.encoder.encode(obj))
+        if len(self.buffer) >= self.buffer_lines:
+            self.flush()
+
+    def write_many(self, objs):
+        for obj in objs:
+            self.write(obj)
+
+    def flush(self):
+        if not len(self.buffer):
+            return
+        self.buffer.append('')
+        text = '\n'.join(self.buffer)
+        if self.binary:
+            text = text.encode(self.encoding)
+        self.fileobj.write(text)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,6 +1,8 @@
 from jsonmapping.visitor import SchemaVisitor
 from jsonmapping.value import extract_value
-from jsonmapping.util import validate_mapping
+from jsonmapping.util import validate_mapping, ASYNC_SUPPORTED
+from jsonmapping.compiled import CompiledMapper
+from jsonmapping.parallel import apply_parallel
 
 
 class Mapper(object):
@@ -9,7 +11,8 @@ class Mapper(object):
     JSON structure as specified by the JSON schema associated with the given
     mapping. """
 
-    def __init__(self, mapping, resolver, visitor=None, scope=None):
+    def __init__(self, mapping, resolver, visitor=None, scope=None,
+                 validate=True):
         self.mapping = mapping.copy()
         if '$ref' in self.mapping:
             with resolver.in_scope(scope):
@@ -17,10 +20,28 @@ class Mapper(object):
                 self.mapping.update(data)
         if visitor is None:
             schema = self.mapping.get('schema')
-            visitor = SchemaVisitor(schema, resolver, scope=scope)
+            visitor = SchemaVisitor.cached(schema, resolver, scope=scope)
         self.visitor = visitor
-        if self.visitor.parent is None:
-            validate_mapping(self.mapping) is not None
+        if validate and self.visitor.parent is None:
+            validate_mapping(self.mapping)
+
+    @classmethod
+    def from_snapshot(cls, path, resolver=None, key=None):
+        """ Load a mapper built and saved with
+        ``jsonmapping.snapshot.save_snapshot``, without resolving or
+        validating anything. """
+        from jsonmapping.snapshot import load_snapshot
+        snapshot = load_snapshot(path, resolver=resolver, key=key)
+        if snapshot.mapper is None:
+            raise ValueError('Snapshot has no mapping: %s' % path)
+        return snapshot.mapper
+
+    def __getstate__(self):
+        # The compiled plan is made of closures, which cannot be pickled;
+        # it is rebuilt on demand.
+        state = self.__dict__.copy()
+        state.pop('_compiled', None)
+        return state
 
     @property
     def optional(self):
@@ -49,6 +70,30 @@ class Mapper(object):
                 self._children = None
         return self._children
 
+    @property
+    def columns(self):
+        """ The set of source columns which are read by this mapping. """
+        if self.visitor.is_object:
+            columns = set()
+            for child in self.children:
+                columns.update(child.columns)
+            return columns
+        elif self.visitor.is_array:
+            return self.children.columns
+        columns = self.mapping.get('columns', [self.mapping.get('column')])
+        return set([c for c in columns if c is not None])
+
+    def compile(self, profiler=None):
+        """ Resolve the mapper tree into a ``CompiledMapper``, which does the
+        same work as ``apply`` without re-interpreting the mapping for each
+        row. The plan is built once and kept. If a ``MappingProfiler`` is
+        given, a separate, instrumented plan is built instead. """
+        if profiler is not None:
+            return CompiledMapper(self, profiler=profiler)
+        if not hasattr(self, '_compiled'):
+            self._compiled = CompiledMapper(self)
+        return self._compiled
+
     def apply(self, data):
         """ Apply the given mapping to ``data``, recursively. The return type
         is a tuple of a boolean and the resulting data element. The boolean
@@ -78,13 +123,66 @@ class Mapper(object):
         elif self.visitor.is_value:
             return extract_value(self.mapping, self.visitor, data)
 
+    def apply_batch(self, columns):
+        """ Apply the mapping to a column-oriented batch of data, given as a
+        mapping of column names to sequences of values. Column-wise work such
+        as transforms is done once per column rather than once per cell.
+        Returns a list with one object for each row of the batch. """
+        return self.compile().apply_batch(columns)
+
     @classmethod
-    def apply_iter(cls, rows, mapping, resolver, scope=None):
+    def apply_iter(cls, rows, mapping, resolver, scope=None, validate=True,
+                   profiler=None):
         """ Given an iterable ``rows`` that yield data records, and a
         ``mapping`` which is to be applied to them, return a tuple of
         ``data`` (the generated object graph) and ``err``, a validation
-        exception if the resulting data did not match the expected schema. """
-        mapper = cls(mapping, resolver, scope=scope)
-        for row in rows:
-            _, data = mapper.apply(row)
+        exception if the resulting data did not match the expected schema.
+        Set ``validate`` to ``False`` to skip checking a mapping that is
+        known to be valid. A ``MappingProfiler`` can be passed to collect
+        statistics about each node of the mapping. """
+        mapper = cls(mapping, resolver, scope=scope, validate=validate)
+        for data in mapper.compile(profiler=profiler).apply_iter(rows):
             yield data
+
+    @classmethod
+    def dump_iter(cls, rows, mapping, resolver, sink, scope=None,
+                  validate=True):
+        """ Map ``rows`` and write the results to ``sink`` as JSON Lines,
+        encoding each object straight to bytes rather than building it.
+        ``sink`` is a bytearray, a binary file object or a function which is
+        called with blocks of output. Returns the number of rows. """
+        mapper = cls(mapping, resolver, scope=scope, validate=validate)
+        return mapper.compile().dump_iter(rows, sink)
+
+    @classmethod
+    def apply_aiter(cls, rows, mapping, resolver, scope=None, validate=True,
+                    batch_size=500, max_pending=2, executor=None):
+        """ Like ``apply_iter``, for an async iterator of ``rows``; returns
+        an async iterator of the mapped objects, in order. Rows are mapped in
+        batches of ``batch_size``. The batches are mapped in the event loop,
+        or by an ``executor`` to keep the loop responsive: ``'thread'`` or
+        ``'process'`` start a pool of ``max_pending`` workers, or pass a
+        thread-based ``concurrent.futures.Executor``. At most ``max_pending``
+        batches are in flight while more rows are read. Requires Python 3.6
+        (3.7 for process pools). """
+        if not ASYNC_SUPPORTED:
+            raise RuntimeError('apply_aiter requires Python 3.6 or later.')
+        from jsonmapping.aio import apply_aiter
+        return apply_aiter(cls, rows, mapping, resolver, scope=scope,
+                           validate=validate, batch_size=batch_size,
+                           max_pending=max_pending, executor=executor)
+
+    @classmethod
+    def apply_parallel(cls, rows, mapping, resolver, scope=None, workers=None,
+                       chunksize=1000, ordered=True, max_pending=None,
+                       validate=True):
+        """ Like ``apply_iter``, but map chunks of ``chunksize`` rows in a
+        pool of ``workers`` processes (one per CPU by default). The mapping
+        and the resolver store are sent to each worker once. Results are
+        yielded in the order of ``rows`` unless ``ordered`` is ``False``.
+        At most ``max_pending`` chunks (twice the number of workers by
+        default) are in flight, so ``rows`` may be an unbounded iterator. """
+        return apply_parallel(cls, rows, mapping, resolver, scope=scope,
+                              workers=workers, chunksize=chunksize,
+                              ordered=ordered, max_pending=max_pending,
+                              validate=validate)
@@ -2,29 +2,200 @@
 # on super-weird annotations.
 import six
 import logging
+from array import array
 import networkx as nx
 from networkx.readwrite import json_graph
 from collections import Mapping
 
 from jsonmapping import SchemaVisitor
+from jsonmapping.export import GRAPH_NODE, GRAPH_EDGE, EXPORTERS, APPEND_ONLY
+from jsonmapping.export import attribute_keys
+from jsonmapping.parallel import build_network
 
 log = logging.getLogger(__name__)
 
-GRAPH_NODE = 'node'
-GRAPH_EDGE = 'edge'
+
+class NetworkXBackend(object):
+    """ Keep the network in a networkx ``MultiGraph``. """
+
+    def __init__(self):
+        self.graph = nx.MultiGraph()
+        self.edge_ids = set()
+        self.drained = set()
+
+    def has_node(self, node_id):
+        return self.graph.has_node(node_id)
+
+    def add_node(self, node_id, attrs):
+        self.graph.add_node(node_id, attr_dict=attrs)
+
+    def has_edge(self, entity_id):
+        return entity_id in self.edge_ids
+
+    def add_edge(self, source, target, attrs, entity_id=None):
+        if entity_id is not None:
+            self.edge_ids.add(entity_id)
+        self.graph.add_edge(source, target, attr_dict=attrs)
+
+    def merge_node(self, node_id, attrs):
+        """ Add a node, or fill in the attributes it is missing. """
+        if not self.graph.has_node(node_id):
+            return self.add_node(node_id, attrs)
+        existing = self.graph.node[node_id]
+        for key, value in attrs.items():
+            existing.setdefault(key, value)
+
+    def to_networkx(self):
+        return self.graph
+
+    def node_link_data(self):
+        return json_graph.node_link_data(self.graph)
+
+    def iter_nodes(self):
+        nodes = getattr(self.graph, 'nodes_iter', self.graph.nodes)
+        return nodes(data=True)
+
+    def iter_edges(self):
+        edges = getattr(self.graph, 'edges_iter', self.graph.edges)
+        return edges(data=True)
+
+    def drain(self):
+        """ Return the nodes and edges added since the last call, then drop
+        all edges and the attributes of the returned nodes. The node IDs are
+        kept so that later entities can still link to them. """
+        nodes = [(n, dict(a)) for (n, a) in self.iter_nodes()
+                 if n not in self.drained]
+        edges = list(self.iter_edges())
+        self.graph.remove_edges_from([(s, t) for (s, t, _) in edges])
+        for node_id, _ in nodes:
+            self.drained.add(node_id)
+            self.graph.node[node_id].clear()
+        return nodes, edges
+
+
+class AdjacencyBackend(object):
+    """ Keep the network in compact arrays: node IDs are interned to integer
+    indexes, and edges are stored as two arrays of source and target
+    indexes, with a parallel list of their attributes. This uses far less
+    memory than networkx for large graphs, and can be exported to networkx
+    when needed. """
+
+    def __init__(self):
+        self.index = {}
+        self.nodes = []
+        self.node_attrs = []
+        self.sources = array('l')
+        self.targets = array('l')
+        self.edge_attrs = []
+        self.edge_ids = set()
+        self.drained = 0
+
+    def _intern(self, node_id):
+        idx = self.index.get(node_id)
+        if idx is None:
+            idx = self.index[node_id] = len(self.nodes)
+            self.nodes.append(node_id)
+            self.node_attrs.append({})
+        return idx
+
+    def has_node(self, node_id):
+        return node_id in self.index
+
+    def add_node(self, node_id, attrs):
+        idx = self._intern(node_id)
+        if self.node_attrs[idx] is None:
+            self.node_attrs[idx] = {}
+        self.node_attrs[idx].update(attrs)
+
+    def merge_node(self, node_id, attrs):
+        """ Add a node, or fill in the attributes it is missing. """
+        idx = self._intern(node_id)
+        if self.node_attrs[idx] is None:
+            self.node_attrs[idx] = {}
+        existing = self.node_attrs[idx]
+        for key, value in attrs.items():
+            existing.setdefault(key, value)
+
+    def has_edge(self, entity_id):
+        return entity_id in self.edge_ids
+
+    def add_edge(self, source, target, attrs, entity_id=None):
+        if entity_id is not None:
+            self.edge_ids.add(entity_id)
+        self.sources.append(self._intern(source))
+        self.targets.append(self._intern(target))
+        self.edge_attrs.append(attrs)
+
+    def to_networkx(self):
+        graph = nx.MultiGraph()
+        for node_id, attrs in zip(self.nodes, self.node_attrs):
+            graph.add_node(node_id, attr_dict=attrs)
+        for source, target, attrs in zip(self.sources, self.targets,
+                                         self.edge_attrs):
+            graph.add_edge(self.nodes[source], self.nodes[target],
+                           attr_dict=attrs)
+        return graph
+
+    def node_link_data(self):
+        return json_graph.node_link_data(self.to_networkx())
+
+    def iter_nodes(self):
+        return ((n, a or {}) for (n, a) in zip(self.nodes, self.node_attrs))
+
+    def iter_edges(self):
+        nodes = self.nodes
+        return ((nodes[s], nodes[t], a) for (s, t, a) in
+                zip(self.sources, self.targets, self.edge_attrs))
+
+    def drain(self):
+        """ Return the nodes and edges added since the last call, then drop
+        all edges and the attributes of the returned nodes. The node IDs are
+        kept so that later entities can still link to them. """
+        start, self.drained = self.drained, len(self.nodes)
+        nodes = list(zip(self.nodes[start:], self.node_attrs[start:]))
+        edges = list(self.iter_edges())
+        for idx in range(start, self.drained):
+            self.node_attrs[idx] = None
+        self.sources = array('l')
+        self.targets = array('l')
+        self.edge_attrs = []
+        return nodes, edges
 
 
 class Network(object):
     """ This operator will consume a set of JSON schema-defined entities
     and attempt to generate a network based on their linkages. For this,
     special annotations are added to the network, which describe the
-    'graph' role of the given schema (i.e. 'node', or 'edge'). """
+    'graph' role of the given schema (i.e. 'node', or 'edge'). The network
+    is stored in a ``backend``, by default a networkx graph. Dangling edges,
+    of which only one node is known, are only kept if ``keep_dangling`` is
+    set, or when they are merged from a shard. """
     # FIXME: this assets all entities have an ID
 
-    def __init__(self, resolver):
+    def __init__(self, resolver, backend=None, keep_dangling=False):
         self.resolver = resolver
-        self.graph = nx.MultiGraph()
-        self.edge_ids = set()
+        if backend is None:
+            backend = NetworkXBackend()
+        self.backend = backend
+        self.keep_dangling = keep_dangling
+        self.dangling = {}
+        self.flushed = False
+
+    @property
+    def graph(self):
+        """ The networkx graph of a ``NetworkXBackend``. Other backends need
+        to be converted with ``to_networkx``. """
+        return self.backend.graph
+
+    @property
+    def edge_ids(self):
+        """ The entity IDs of the edges in the network. """
+        return self.backend.edge_ids
+
+    def to_networkx(self):
+        """ Get the network as a networkx graph. For backends other than
+        ``NetworkXBackend`` this builds a new graph on each call. """
+        return self.backend.to_networkx()
 
     def _get_visitor(self, entity, schema=None):
         if schema is None:
@@ -33,7 +204,7 @@ class Network(object):
             schema = {'$ref': schema}
         if schema is None:
             raise TypeError('No schema defined for network mapping.')
-        return SchemaVisitor(schema, self.resolver)
+        return SchemaVisitor.cached(schema, self.resolver)
 
     def _simple_object(self, entity, visitor):
         data = {}
@@ -54,9 +225,9 @@ class Network(object):
             if data_id is None:
                 continue
 
-            if not self.graph.has_node(data_id):
+            if not self.backend.has_node(data_id):
                 attrs = self._simple_object(data, prop)
-                self.graph.add_node(data_id, attr_dict=attrs)
+                self.backend.add_node(data_id, attrs)
 
             if source_id is None:
                 source_id = data_id
@@ -65,6 +236,7 @@ class Network(object):
                 return max(source_id, data_id), min(source_id, data_id)
 
         log.warning("Dangling edge: %r; source: %s", entity, source_id)
+        return source_id
 
     def _add_entity(self, entity, visitor, parent=None):
         if visitor.is_object and isinstance(entity, Mapping):
@@ -72,14 +244,16 @@ class Network(object):
             entity_id = entity.get('id')
 
             if visitor.graph == GRAPH_NODE:
-                if not self.graph.has_node(entity_id):
-                    self.graph.add_node(entity_id, attr_dict=attrs)
+                if not self.backend.has_node(entity_id):
+                    self.backend.add_node(entity_id, attrs)
 
             if visitor.graph == GRAPH_EDGE:
                 edge = self._get_nodes(entity, visitor, parent=parent)
-                if edge is not None and entity_id not in self.edge_ids:
-                    self.edge_ids.add(entity_id)
-                    self.graph.add_edge(edge[0], edge[1], attr_dict=attrs)
+                if isinstance(edge, tuple):
+                    if not self.backend.has_edge(entity_id):
+                        self._add_edge(entity_id, edge[0], edge[1], attrs)
+                elif self.keep_dangling:
+                    self._add_dangling(entity_id, edge, attrs)
 
             # Recurse down the entity
             for prop in visitor.properties:
@@ -90,12 +264,123 @@ class Network(object):
             for child in entity:
                 self._add_entity(child, visitor.items, parent=parent)
 
+    def _add_edge(self, entity_id, source, target, attrs):
+        self.dangling.pop(entity_id, None)
+        self.backend.add_edge(source, target, attrs, entity_id=entity_id)
+
+    def _add_dangling(self, entity_id, source_id, attrs):
+        """ Keep an edge of which only one node is known. If the same edge
+        entity was seen with another node before, e.g. nested in a different
+        parent, both ends are joined into an edge. """
+        if entity_id is None or self.backend.has_edge(entity_id):
+            return
+        other_id, other_attrs = self.dangling.get(entity_id, (None, None))
+        if other_id is None:
+            self.dangling[entity_id] = (source_id, attrs)
+            return
+        if source_id is None or other_id == source_id:
+            return
+        self._add_edge(entity_id, max(source_id, other_id),
+                       min(source_id, other_id), other_attrs)
+
     def add(self, entity, schema=None):
         visitor = self._get_visitor(entity, schema=schema)
         self._add_entity(entity, visitor)
 
+    def add_many(self, entities, schema=None):
+        """ Add all of the given ``entities``, looking up the visitor for
+        each schema only once. """
+        visitors = {}
+        for entity in entities:
+            key = schema if schema is not None else entity.get('$schema')
+            if not isinstance(key, six.string_types):
+                self.add(entity, schema=schema)
+                continue
+            if key not in visitors:
+                visitors[key] = self._get_visitor(entity, schema=key)
+            self._add_entity(entity, visitors[key])
+
+    def merge(self, state):
+        """ Merge a partial network, as returned by ``NetworkShard.state``.
+        Nodes are de-duplicated by ID, with the attributes already present
+        taking precedence and missing ones filled in from ``state``. Edges
+        are de-duplicated by their entity ID, and dangling edges are joined
+        with the other end found in this network. """
+        for node_id, attrs in state['nodes']:
+            self.backend.merge_node(node_id, attrs)
+        for entity_id, source, target, attrs in state['edges']:
+            if not self.backend.has_edge(entity_id):
+                self._add_edge(entity_id, source, target, attrs)
+        for entity_id, (source_id, attrs) in state['dangling']:
+            self._add_dangling(entity_id, source_id, attrs)
+
+    def add_parallel(self, entities, schema=None, workers=None,
+                     chunksize=1000, max_pending=None):
+        """ Add ``entities`` using a pool of ``workers`` processes. Each
+        chunk of ``chunksize`` entities is built into a ``NetworkShard`` by a
+        worker and merged into this network in the order of the input, so
+        the result does not depend on the number of workers. """
+        return build_network(self, entities, schema=schema, workers=workers,
+                             chunksize=chunksize, max_pending=max_pending)
+
     def to_dict(self):
-        return json_graph.node_link_data(self.graph)
+        return self.backend.node_link_data()
+
+    def export(self, fh, format='jsonl', **kwargs):
+        """ Stream the network to the text file object ``fh``, as one of
+        ``jsonl``, ``node-link``, ``graphml`` or ``csv`` (an edge list).
+        Unlike ``to_dict``, this writes one node or edge at a time. """
+        if format not in EXPORTERS:
+            raise ValueError('Unknown export format: %r' % format)
+        nodes, edges = self.backend.iter_nodes, self.backend.iter_edges
+        if format == 'graphml':
+            kwargs['node_keys'] = attribute_keys(nodes(), 1)
+            kwargs['edge_keys'] = attribute_keys(edges(), 2)
+        if format == 'csv':
+            return EXPORTERS[format](fh, edges(), **kwargs)
+        return EXPORTERS[format](fh, nodes(), edges(), **kwargs)
+
+    def flush(self, fh, format='jsonl', **kwargs):
+        """ Append the nodes and edges added since the last flush to ``fh``
+        and evict them from memory: edges are dropped and nodes only keep
+        their ID. Only append-only formats (``jsonl`` and ``csv``) can be
+        flushed. """
+        if format not in APPEND_ONLY:
+            raise ValueError('Cannot flush to format: %r' % format)
+        nodes, edges = self.backend.drain()
+        if format == 'csv':
+            kwargs.setdefault('header', not self.flushed)
+            EXPORTERS[format](fh, edges, **kwargs)
+        else:
+            EXPORTERS[format](fh, nodes, edges, **kwargs)
+        self.flushed = True
 
     def __repr__(self):
         return '<JSONNetwork()>'
+
+
+class NetworkShard(Network):
+    """ A partial network built over one shard of the entities, which keeps
+    the entity ID of each edge so that it can be merged into another
+    network. """
+
+    def __init__(self, resolver):
+        super(NetworkShard, self).__init__(resolver,
+                                           backend=AdjacencyBackend(),
+                                           keep_dangling=True)
+        self.edge_entities = []
+
+    def _add_edge(self, entity_id, source, target, attrs):
+        super(NetworkShard, self)._add_edge(entity_id, source, target, attrs)
+        self.edge_entities.append(entity_id)
+
+    def state(self):
+        """ Get the nodes, edges and dangling edges as plain data, for
+        ``Network.merge``. """
+        edges = [(entity_id, s, t, a) for (entity_id, (s, t, a)) in
+                 zip(self.edge_entities, self.backend.iter_edges())]
+        return {
+            'nodes': list(self.backend.iter_nodes()),
+            'edges': edges,
+            'dangling': list(self.dangling.items())
+        }
@@ -0,0 +1,121 @@
+""" Helpers to run mappings and build networks across a pool of worker
+processes. The mapping and the schemas in the resolver store are sent to each
+worker once, when the pool is started; afterwards, only chunks of rows and
+their results are exchanged. """
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+
+# Compiled mapper of a worker process, set up by ``_init_mapper``.
+_mapper = None
+# Resolver of a worker process, set up by ``_init_network``.
+_resolver = None
+
+
+def resolver_state(resolver):
+    """ Capture a resolver as plain data which can be sent to another
+    process. """
+    return (type(resolver), resolver.resolution_scope, resolver.referrer,
+            dict(resolver.store))
+
+
+def restore_resolver(state):
+    """ Re-create a resolver captured with ``resolver_state``. """
+    cls, base_uri, referrer, store = state
+    return cls(base_uri, referrer, store=store)
+
+
+def _init_mapper(cls, mapping, state, scope):
+    global _mapper
+    resolver = restore_resolver(state)
+    mapper = cls(mapping, resolver, scope=scope, validate=False)
+    _mapper = mapper.compile()
+
+
+def _map_chunk(rows):
+    return list(_mapper.apply_iter(rows))
+
+
+def _init_network(state):
+    global _resolver
+    _resolver = restore_resolver(state)
+
+
+def _network_chunk(entities, schema):
+    from jsonmapping.network import NetworkShard
+    shard = NetworkShard(_resolver)
+    shard.add_many(entities, schema=schema)
+    return shard.state()
+
+
+def iter_chunks(items, size):
+    """ Split an iterable into lists of at most ``size`` items. """
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not len(chunk):
+            return
+        yield chunk
+
+
+def next_result(pending, ordered=True):
+    """ Remove a finished task from the ``pending`` queue and return its
+    result. Unless ``ordered`` is set, any task which is ready is taken
+    instead of waiting for the oldest one. """
+    if ordered:
+        return pending.popleft().get()
+    while True:
+        for result in pending:
+            if result.ready():
+                pending.remove(result)
+                return result.get()
+        pending[0].wait(0.01)
+
+
+def apply_parallel(cls, rows, mapping, resolver, scope=None, workers=None,
+                   chunksize=1000, ordered=True, max_pending=None,
+                   validate=True):
+    """ Map ``rows`` in a pool of ``workers`` processes, see
+    ``Mapper.apply_parallel``. """
+    # Check the mapping here, so that errors are raised in this process:
+    cls(mapping, resolver, scope=scope, validate=validate)
+    workers = workers or cpu_count()
+    max_pending = max_pending or workers * 2
+    pool = Pool(workers, _init_mapper,
+                (cls, mapping, resolver_state(resolver), scope))
+    try:
+        pending = deque()
+        for chunk in iter_chunks(rows, chunksize):
+            pending.append(pool.apply_async(_map_chunk, (chunk,)))
+            while len(pending) >= max_pending:
+                for data in next_result(pending, ordered=ordered):
+                    yield data
+        while len(pending):
+            for data in next_result(pending, ordered=ordered):
+                yield data
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+
+
+def build_network(network, entities, schema=None, workers=None,
+                  chunksize=1000, max_pending=None):
+    """ Build shards of ``entities`` in a pool of ``workers`` processes and
+    merge them into ``network``, see ``Network.add_parallel``. """
+    workers = workers or cpu_count()
+    max_pending = max_pending or workers * 2
+    pool = Pool(workers, _init_network, (resolver_state(network.resolver),))
+    try:
+        pending = deque()
+        for chunk in iter_chunks(entities, chunksize):
+            pending.append(pool.apply_async(_network_chunk, (chunk, schema)))
+            while len(pending) >= max_pending:
+                network.merge(next_result(pending))
+        while len(pending):
+            network.merge(next_result(pending))
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+    return network
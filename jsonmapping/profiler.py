@@ -0,0 +1,85 @@
+from timeit import default_timer
+
+
+class MappingProfiler(object):
+    """ Collects statistics about each node of a mapping while it is applied:
+    the number of values extracted and the time spent on them, the time
+    spent in each transform, failed type casts and skipped optional branches.
+    Nodes are identified by their path in the mapping, e.g.
+    ``memberships/organization/name``.
+
+    Pass an instance to ``Mapper.compile`` or ``Mapper.apply_iter`` to
+    enable it. To forward the measurements to a metrics system, override
+    the hook methods (``value``, ``transform``, ``typecast_failure`` and
+    ``skipped``). In batch mode, each distinct value which fails to convert
+    is reported once per batch. """
+
+    def __init__(self):
+        self.nodes = {}
+
+    def _node(self, path):
+        node = self.nodes.get(path)
+        if node is None:
+            node = self.nodes[path] = {
+                'calls': 0,
+                'time': 0.0,
+                'transforms': {},
+                'typecast_failures': 0,
+                'skipped': 0
+            }
+        return node
+
+    def value(self, path, seconds, calls=1):
+        """ ``calls`` values were extracted at ``path``, in ``seconds``. """
+        node = self._node(path)
+        node['calls'] += calls
+        node['time'] += seconds
+
+    def transform(self, path, name, seconds):
+        """ The transform ``name`` took ``seconds`` at ``path``. """
+        transforms = self._node(path)['transforms']
+        transforms[name] = transforms.get(name, 0.0) + seconds
+
+    def typecast_failure(self, path, value):
+        """ ``value`` could not be converted to the type of ``path``. """
+        self._node(path)['typecast_failures'] += 1
+
+    def skipped(self, path):
+        """ The optional branch at ``path`` was empty and left out. """
+        self._node(path)['skipped'] += 1
+
+    def report(self):
+        """ Get the statistics of all nodes, slowest first. """
+        nodes = sorted(self.nodes.items(), key=lambda n: n[1]['time'],
+                       reverse=True)
+        return [dict(stats, path=path) for (path, stats) in nodes]
+
+
+def profile_transform(profiler, path, name, func):
+    """ Wrap a transform function to report the time spent in it. """
+    def transform(mapping, bind, values):
+        start = default_timer()
+        values = list(func(mapping, bind, values))
+        profiler.transform(path, name, default_timer() - start)
+        return values
+    return transform
+
+
+def profile_value(profiler, path, extract):
+    """ Wrap a compiled value extractor to report its calls and time. """
+    def profiled(data):
+        start = default_timer()
+        result = extract(data)
+        profiler.value(path, default_timer() - start)
+        return result
+    return profiled
+
+
+def profile_column(profiler, path, extract):
+    """ Wrap a compiled column extractor to report its calls and time. """
+    def profiled(data, size):
+        start = default_timer()
+        results = extract(data, size)
+        profiler.value(path, default_timer() - start, calls=size)
+        return results
+    return profiled
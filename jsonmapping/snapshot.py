@@ -0,0 +1,149 @@
+""" Snapshots of fully built mappers and statement visitors, for processes
+which need to start quickly. Building a ``Mapper`` resolves every ``$ref``,
+builds the visitor tree, validates the mapping and matches it against the
+schema properties; a snapshot stores the result of that work in a file, so
+that it can be loaded without a resolver and without any JSON schema work.
+
+Snapshots are pickles, so only load snapshots you have written yourself. """
+import os
+import json
+import pickle
+import tempfile
+
+from jsonmapping.mapper import Mapper
+from jsonmapping.statements import StatementsVisitor
+from jsonmapping.util import content_hash
+
+# Bump this if the layout of mappers or visitors changes.
+SNAPSHOT_FORMAT = 1
+MAGIC = b'jsonmapping-snapshot\n'
+
+# Persistent ID which stands in for the resolver in the pickle.
+RESOLVER_ID = 'resolver'
+
+
+class Snapshot(object):
+    """ The content of a snapshot file: the ``mapper`` built for a mapping
+    (or ``None``) and a dict of statement ``visitors`` by schema URI. """
+
+    def __init__(self, key, mapper=None, visitors=None):
+        self.key = key
+        self.mapper = mapper
+        self.visitors = visitors or {}
+
+
+class SnapshotPickler(pickle.Pickler):
+    """ Leave the resolver out of the pickle, since it holds all schemas. """
+
+    def __init__(self, fh, resolver):
+        pickle.Pickler.__init__(self, fh, pickle.HIGHEST_PROTOCOL)
+        self.resolver = resolver
+
+    def persistent_id(self, obj):
+        if obj is self.resolver:
+            return RESOLVER_ID
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+    """ Put the given resolver (or ``None``) in the place of the one the
+    snapshot was built with. """
+
+    def __init__(self, fh, resolver):
+        pickle.Unpickler.__init__(self, fh)
+        self.resolver = resolver
+
+    def persistent_load(self, pid):
+        if pid != RESOLVER_ID:
+            raise pickle.UnpicklingError('Invalid persistent ID: %r' % pid)
+        return self.resolver
+
+
+def snapshot_key(resolver, mapping=None, schemas=(), scope=None):
+    """ Hash the mapping, the schema URIs and the schemas in the resolver
+    store, to check whether a snapshot is still current. """
+    return content_hash(SNAPSHOT_FORMAT, mapping, sorted(schemas), scope,
+                        dict(resolver.store))
+
+
+def _expand_mapper(mapper):
+    children = mapper.children
+    if mapper.visitor.is_array:
+        _expand_mapper(children)
+    elif mapper.visitor.is_object:
+        for child in children:
+            _expand_mapper(child)
+
+
+def _expand_visitor(visitor, depth):
+    if depth <= 0:
+        return
+    if visitor.is_object:
+        for prop in visitor.properties:
+            _expand_visitor(prop, depth - 1)
+    elif visitor.is_array:
+        _expand_visitor(visitor.items, depth - 1)
+
+
+def build_snapshot(resolver, mapping=None, schemas=(), scope=None,
+                   validate=True, depth=4, visitor_cls=StatementsVisitor):
+    """ Build the mapper for ``mapping`` and a statements visitor for each of
+    the ``schemas`` URIs. Schemas can refer to each other in cycles, so the
+    visitor trees are only built ``depth`` levels deep; deeper levels need
+    a resolver when they are used. """
+    mapper = None
+    if mapping is not None:
+        mapper = Mapper(mapping, resolver, scope=scope, validate=validate)
+        _expand_mapper(mapper)
+    visitors = {}
+    for uri in schemas:
+        visitor = visitor_cls({'$ref': uri}, resolver, scope=scope)
+        _expand_visitor(visitor, depth)
+        visitors[uri] = visitor
+    key = snapshot_key(resolver, mapping=mapping, schemas=schemas,
+                       scope=scope)
+    return Snapshot(key, mapper=mapper, visitors=visitors)
+
+
+def save_snapshot(path, resolver, mapping=None, schemas=(), **kwargs):
+    """ Build a snapshot (see ``build_snapshot``) and write it to ``path``.
+    Returns the snapshot key. The file is replaced atomically, so running
+    processes never load a partial snapshot. """
+    snapshot = build_snapshot(resolver, mapping=mapping, schemas=schemas,
+                              **kwargs)
+    header = {'format': SNAPSHOT_FORMAT, 'key': snapshot.key}
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(MAGIC)
+            fh.write(json.dumps(header).encode('utf-8') + b'\n')
+            SnapshotPickler(fh, resolver).dump(snapshot)
+        os.rename(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return snapshot.key
+
+
+def read_header(fh):
+    """ Read and check the header of a snapshot file. """
+    if fh.readline() != MAGIC:
+        raise ValueError('Not a jsonmapping snapshot.')
+    header = json.loads(fh.readline().decode('utf-8'))
+    if header.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError('Unsupported snapshot format: %r' %
+                         header.get('format'))
+    return header
+
+
+def load_snapshot(path, resolver=None, key=None):
+    """ Load a snapshot written by ``save_snapshot``. If ``key`` is given,
+    the snapshot must have been built for it (see ``snapshot_key``). The
+    ``resolver``, if any, is attached to the visitors, so that parts of the
+    schemas which were not in the snapshot can still be resolved. """
+    with open(path, 'rb') as fh:
+        header = read_header(fh)
+        if key is not None and header.get('key') != key:
+            raise ValueError('Snapshot is out of date: %s' % path)
+        return SnapshotUnpickler(fh, resolver).load()
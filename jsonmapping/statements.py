@@ -1,8 +1,11 @@
+import six
+import json
 import uuid
 from collections import Mapping
 import typecast
 
 from jsonmapping.visitor import SchemaVisitor
+from jsonmapping.util import ASYNC_SUPPORTED
 
 
 TYPE_SCHEMA = '$schema'
@@ -14,6 +17,23 @@ class StatementsVisitor(SchemaVisitor):
     objects into a series of RDF-like statements (i.e. subject, predicate,
     object, context) quads. It can be used independently of any specific
     storage backend, including RDF. """
+    __slots__ = ('_predicate', '_reverse', '_property_index')
+
+    # Set this in a subclass to derive the subjects of objects without an ID
+    # from their content, rather than generating random ones.
+    stable_subjects = False
+    subject_namespace = uuid.NAMESPACE_URL
+
+    @classmethod
+    def from_snapshot(cls, path, schema_uri, resolver=None, key=None):
+        """ Load the visitor for ``schema_uri`` from a snapshot saved with
+        ``jsonmapping.snapshot.save_snapshot``. """
+        from jsonmapping.snapshot import load_snapshot
+        snapshot = load_snapshot(path, resolver=resolver, key=key)
+        if schema_uri not in snapshot.visitors:
+            raise ValueError('Schema %r is not in snapshot: %s' %
+                             (schema_uri, path))
+        return snapshot.visitors[schema_uri]
 
     @property
     def subject(self):
@@ -23,67 +43,131 @@ class StatementsVisitor(SchemaVisitor):
         """ Try to get a unique ID from the object. By default, this will be
         the 'id' field of any given object, or a field specified by the
         'rdfSubject' property. If no other option is available, a UUID will be
-        generated. """
+        generated. The UUID is random, unless the schema lists the fields
+        which identify an object in 'rdfSubjectFields', or the visitor class
+        sets ``stable_subjects``: then it is derived from the schema path and
+        those fields (or the whole object), and stays the same across runs.
+        Objects which have none of the subject fields get a random UUID. """
         if not isinstance(data, Mapping):
             return None
         if data.get(self.subject):
             return data.get(self.subject)
-        return uuid.uuid4().urn
+        fields = self.schema.get('rdfSubjectFields')
+        if fields is not None:
+            data = dict((f, data.get(f)) for f in fields)
+            if all(v is None for v in data.values()):
+                return uuid.uuid4().urn
+        elif not self.stable_subjects:
+            return uuid.uuid4().urn
+        key = json.dumps([self.path, data], sort_keys=True,
+                         default=six.text_type)
+        return uuid.uuid5(self.subject_namespace, key).urn
 
     @property
     def predicate(self):
-        return self.schema.get('rdfName', self.name)
+        if not hasattr(self, '_predicate'):
+            self._predicate = self.schema.get('rdfName', self.name)
+        return self._predicate
 
     @property
     def reverse(self):
         """ Reverse links make sense for object to object links where we later
         may want to also query the reverse of the relationship, e.g. when obj1
         is a child of obj2, we want to infer that obj2 is a parent of obj1. """
-        name = self.schema.get('rdfReverse')
-        if name is not None:
-            return name
-        if self.parent is not None and self.parent.is_array:
-            return self.parent.reverse
+        if not hasattr(self, '_reverse'):
+            self._reverse = self.schema.get('rdfReverse')
+            if self._reverse is None and self.parent is not None \
+                    and self.parent.is_array:
+                self._reverse = self.parent.reverse
+        return self._reverse
 
     def get_property(self, predicate):
-        for prop in self.properties:
-            if predicate == prop.name:
-                return prop
+        """ Find the property for a statement predicate, which can be either
+        the name of the property or its ``rdfName``. """
+        if not hasattr(self, '_property_index'):
+            index = {}
+            for prop in reversed(self.properties):
+                index[prop.predicate] = prop
+            for prop in self.properties:
+                index[prop.name] = prop
+            self._property_index = index
+        return self._property_index.get(predicate)
 
     def triplify(self, data, parent=None):
         """ Recursively generate statements from the data supplied. """
+        statements = []
+        self._triplify(data, parent, statements.append)
+        return iter(statements)
+
+    def triplify_batches(self, objects, batch_size=10000, unique_types=False,
+                         columns=False):
+        """ Generate the statements for each of the ``objects`` and return
+        them in lists of ``batch_size`` statements (the last batch may be
+        smaller), e.g. to feed bulk inserts. If ``unique_types`` is set,
+        repeated ``$schema`` type statements are only included once per
+        batch. With ``columns``, each batch is a tuple of four lists
+        (subjects, predicates, objects and types) instead. """
+        batch = []
+        seen = set()
+
+        def emit(stmt):
+            if unique_types and stmt[1] == TYPE_SCHEMA:
+                if stmt in seen:
+                    return
+                seen.add(stmt)
+            batch.append(stmt)
+
+        for obj in objects:
+            self._triplify(obj, None, emit)
+            while len(batch) >= batch_size:
+                chunk = batch[:batch_size]
+                del batch[:batch_size]
+                seen.clear()
+                seen.update(s for s in batch if s[1] == TYPE_SCHEMA)
+                yield self._batch(chunk, columns)
+        if len(batch):
+            yield self._batch(batch, columns)
+
+    def _batch(self, statements, columns):
+        if not columns:
+            return statements
+        if not len(statements):
+            return ([], [], [], [])
+        return tuple(list(c) for c in zip(*statements))
+
+    def _triplify(self, data, parent, emit):
+        """ Pass each statement for ``data`` to ``emit``, calling the child
+        visitors directly rather than chaining generators. """
         if data is None:
             return
 
         if self.is_object:
-            for res in self._triplify_object(data, parent):
-                yield res
+            self._triplify_object(data, parent, emit)
         elif self.is_array:
+            items = self.items
             for item in data:
-                for res in self.items.triplify(item, parent):
-                    yield res
+                items._triplify(item, parent, emit)
         else:
             # TODO: figure out if I ever want to check for reverse here.
             type_name = typecast.name(data)
             obj = typecast.stringify(type_name, data)
             if obj is not None:
                 obj = obj.strip()
-            yield (parent, self.predicate, obj, type_name)
+            emit((parent, self.predicate, obj, type_name))
 
-    def _triplify_object(self, data, parent):
+    def _triplify_object(self, data, parent, emit):
         """ Create bi-directional statements for object relationships. """
         subject = self.get_subject(data)
         if self.path:
-            yield (subject, TYPE_SCHEMA, self.path, TYPE_SCHEMA)
+            emit((subject, TYPE_SCHEMA, self.path, TYPE_SCHEMA))
 
         if parent is not None:
-            yield (parent, self.predicate, subject, TYPE_LINK)
+            emit((parent, self.predicate, subject, TYPE_LINK))
             if self.reverse is not None:
-                yield (subject, self.reverse, parent, TYPE_LINK)
+                emit((subject, self.reverse, parent, TYPE_LINK))
 
         for prop in self.properties:
-            for res in prop.triplify(data.get(prop.name), subject):
-                yield res
+            prop._triplify(data.get(prop.name), subject, emit)
 
     # Clever Method Names Award, 2014 and two years running
     def objectify(self, load, node, depth=2, path=None):
@@ -105,6 +189,91 @@ class StatementsVisitor(SchemaVisitor):
         else:
             return node
 
+    def objectify_many(self, load_many, nodes, depth=2):
+        """ Like ``objectify``, for a list of ``nodes``, but using a loader
+        which fetches the statements of many subjects at once. The graph is
+        walked breadth-first, so that each level of depth costs a single
+        call to ``load_many(subjects)``. The loader must return a mapping of
+        each requested subject to an iterable of its statements; subjects
+        without statements may be left out. """
+        statements = {}
+        planner = self._plan_loads(nodes, depth, statements)
+        try:
+            subjects = next(planner)
+            while True:
+                subjects = planner.send(load_many(subjects))
+        except StopIteration:
+            pass
+        return self._objectify_loaded(statements, nodes, depth)
+
+    def objectify_async(self, load_many, node, depth=2):
+        """ Like ``objectify_many`` for a single ``node``, with a loader which
+        returns awaitables for use with asyncio. Returns a coroutine.
+        Requires Python 3.6 or later. """
+        if not ASYNC_SUPPORTED:
+            raise RuntimeError('objectify_async requires Python 3.6 or '
+                               'later.')
+        from jsonmapping.aio import objectify
+        return objectify(self, load_many, node, depth=depth)
+
+    def _plan_loads(self, nodes, depth, statements):
+        """ Generator which walks the graph level by level, yielding the list
+        of subjects to load for each level and expecting to be sent the
+        result of the loader. The loaded statements are kept in
+        ``statements``. """
+        frontier = []
+        for node in nodes:
+            frontier.extend(self._load_targets(node, depth, frozenset()))
+        while len(frontier):
+            subjects, seen = [], set()
+            for (_, node, _, _) in frontier:
+                if node not in statements and node not in seen:
+                    seen.add(node)
+                    subjects.append(node)
+            if len(subjects):
+                loaded = yield subjects
+                for subject in subjects:
+                    statements[subject] = list(loaded.get(subject, []))
+
+            next_frontier = []
+            for (visitor, node, depth, path) in frontier:
+                next_frontier.extend(visitor._expand_loads(
+                    statements[node], node, depth, path))
+            frontier = next_frontier
+
+    def _load_targets(self, node, depth, path):
+        """ Return the ``(visitor, node, depth, path)`` tuples for which
+        ``objectify`` would call the loader. """
+        if depth < 1 or self.is_value:
+            return []
+        if self.is_array:
+            return self.items._load_targets(node, depth, path)
+        return [(self, node, depth, path)]
+
+    def _expand_loads(self, stmts, node, depth, path):
+        """ Find the next level of load targets, following the same rules as
+        ``_objectify_object``. """
+        next_depth = depth
+        if not self.schema.get('inline'):
+            next_depth = depth - 1
+        sub_path = path.union([node])
+        targets = []
+        for stmt in stmts:
+            prop = self.get_property(stmt['predicate'])
+            if prop is None:
+                continue
+            if stmt['object'] in path and not prop.is_value:
+                continue
+            targets.extend(prop._load_targets(stmt['object'], next_depth,
+                                              sub_path))
+        return targets
+
+    def _objectify_loaded(self, statements, nodes, depth):
+        """ Build objects from statements which have already been loaded. """
+        def load(subject):
+            return statements.get(subject, [])
+        return [self.objectify(load, node, depth) for node in nodes]
+
     def _objectify_object(self, load, node, depth, path):
         # Support inline objects which don't count towards the depth.
         next_depth = depth
@@ -121,6 +290,8 @@ class StatementsVisitor(SchemaVisitor):
             '$attrcount': 0,
             '$linkcount': 0,
         }
+        # Sets for fast de-duplication, the lists keep the order.
+        sources, collections, authors = set(), set(), set()
         for stmt in load(node):
             prop = self.get_property(stmt['predicate'])
             if prop is None:
@@ -132,17 +303,20 @@ class StatementsVisitor(SchemaVisitor):
                 if stmt['type'] == TYPE_LINK:
                     obj['$linkcount'] += 1
 
-            if stmt.get('source') and \
-                    stmt.get('source') not in obj['$sources']:
-                obj['$sources'].append(stmt.get('source'))
+            source = stmt.get('source')
+            if source and source not in sources:
+                sources.add(source)
+                obj['$sources'].append(source)
 
-            if stmt.get('collection') and \
-                    stmt.get('collection') not in obj['$collections']:
-                obj['$collections'].append(stmt.get('collection'))
+            collection = stmt.get('collection')
+            if collection and collection not in collections:
+                collections.add(collection)
+                obj['$collections'].append(collection)
 
-            if stmt.get('author') and \
-                    stmt.get('author') not in obj['$authors']:
-                obj['$authors'].append(stmt.get('author'))
+            author = stmt.get('author')
+            if author and author not in authors:
+                authors.add(author)
+                obj['$authors'].append(author)
 
             value = prop.objectify(load, stmt['object'], next_depth, sub_path)
             if value is None:
@@ -1,11 +1,88 @@
 import re
 import six
+import threading
 from hashlib import sha1
+from collections import OrderedDict
 from unidecode import unidecode
 
 import normality
 
 COLLAPSE = re.compile(r'\s+')
+CLEAN_CATEGORIES = {'C': ' '}
+
+# Default number of values kept in each transform cache.
+CACHE_SIZE = 10000
+CACHE_SETTINGS = {'enabled': False, 'maxsize': CACHE_SIZE}
+CACHES = {}
+
+
+class TransformCache(object):
+    """ A bounded LRU cache in front of a single-value transform function.
+    Only string values are cached, as these are the only ones which the
+    expensive transforms change. The cache is shared by all threads, so it
+    is guarded by a lock; the transform itself runs outside of it. """
+
+    def __init__(self, func, maxsize=CACHE_SIZE):
+        self.func = func
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, value):
+        if self.maxsize <= 0 or not isinstance(value, six.string_types):
+            return self.func(value)
+        with self._lock:
+            try:
+                result = self._values.pop(value)
+                self.hits += 1
+                self._values[value] = result
+                return result
+            except KeyError:
+                self.misses += 1
+        result = self.func(value)
+        with self._lock:
+            self._values.pop(value, None)
+            while len(self._values) >= self.maxsize:
+                self._values.popitem(last=False)
+            self._values[value] = result
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._values)
+            }
+
+
+def configure_cache(enabled=True, maxsize=CACHE_SIZE):
+    """ Enable or disable caching of expensive transforms for all mappings.
+    A mapping can override this with its own ``cache`` flag. Changing the
+    settings resets all caches. """
+    CACHE_SETTINGS['enabled'] = enabled
+    CACHE_SETTINGS['maxsize'] = maxsize
+    CACHES.clear()
+
+
+def cache_stats():
+    """ Get hit and miss counts and the size of each transform cache. """
+    return dict((name, cache.stats()) for (name, cache) in CACHES.items())
+
+
+def value_transform(name, mapping):
+    """ Get the single-value function for the transform ``name``, using a
+    shared cache if the mapping or the global settings ask for it. """
+    func = VALUE_TRANSFORMS[name]
+    if not mapping.get('cache', CACHE_SETTINGS['enabled']):
+        return func
+    cache = CACHES.get(name)
+    if cache is None:
+        cache = TransformCache(func, CACHE_SETTINGS['maxsize'])
+        cache = CACHES.setdefault(name, cache)
+    return cache
 
 
 def transliterate(text):
@@ -23,21 +100,33 @@ def coalesce(mapping, bind, values):
     return []
 
 
+def slugify_value(value):
+    """ Transform a single string into a URL-capable slug. """
+    if isinstance(value, six.string_types):
+        value = transliterate(value)
+        value = normality.slugify(value)
+    return value
+
+
 def slugify(mapping, bind, values):
     """ Transform all values into URL-capable slugs. """
+    func = value_transform('slugify', mapping)
     for value in values:
-        if isinstance(value, six.string_types):
-            value = transliterate(value)
-            value = normality.slugify(value)
-        yield value
+        yield func(value)
+
+
+def latinize_value(value):
+    """ Transliterate a single string into the latin alphabet. """
+    if isinstance(value, six.string_types):
+        value = transliterate(value)
+    return value
 
 
 def latinize(mapping, bind, values):
     """ Transliterate a given string into the latin alphabet. """
+    func = value_transform('latinize', mapping)
     for v in values:
-        if isinstance(v, six.string_types):
-            v = transliterate(v)
-        yield v
+        yield func(v)
 
 
 def join(mapping, bind, values):
@@ -55,27 +144,70 @@ def str_func(name):
     return func
 
 
+def str_column(name):
+    """ Apply functions like upper(), lower() and strip() to a column. """
+    def func(mapping, bind, column):
+        string_types = six.string_types
+        return [getattr(v, name)() if isinstance(v, string_types) else v
+                for v in column]
+    return func
+
+
+def hash_value(value):
+    """ Generate a sha1 for a single non-null value. """
+    if not isinstance(value, six.string_types):
+        value = six.text_type(value)
+    return sha1(value.encode('utf-8')).hexdigest()
+
+
 def hash(mapping, bind, values):
     """ Generate a sha1 for each of the given values. """
+    func = value_transform('hash', mapping)
     for v in values:
         if v is None:
             continue
-        if not isinstance(v, six.string_types):
-            v = six.text_type(v)
-        yield sha1(v.encode('utf-8')).hexdigest()
+        yield func(v)
+
+
+def clean_value(value):
+    """ Perform several types of string cleaning on a single value. """
+    if isinstance(value, six.string_types):
+        value = normality.normalize(value, lowercase=False, collapse=True,
+                                    decompose=False,
+                                    replace_categories=CLEAN_CATEGORIES)
+    return value
 
 
 def clean(mapping, bind, values):
     """ Perform several types of string cleaning for titles etc.. """
-    categories = {'C': ' '}
+    func = value_transform('clean', mapping)
     for value in values:
-        if isinstance(value, six.string_types):
-            value = normality.normalize(value, lowercase=False, collapse=True,
-                                        decompose=False,
-                                        replace_categories=categories)
-        yield value
+        yield func(value)
+
+
+def value_column(name):
+    """ Apply a single-value transform to each cell of a column. """
+    def apply(mapping, bind, column):
+        func = value_transform(name, mapping)
+        return [func(v) for v in column]
+    return apply
+
+
+def hash_column(mapping, bind, column):
+    """ Hash each cell of a column. Null cells are kept in place so that the
+    column stays aligned; they are dropped when rows are assembled. """
+    func = value_transform('hash', mapping)
+    return [None if v is None else func(v) for v in column]
 
 
+# Transforms which can be cached, as single-value functions.
+VALUE_TRANSFORMS = {
+    'slugify': slugify_value,
+    'clean': clean_value,
+    'latinize': latinize_value,
+    'hash': hash_value
+}
+
 TRANSFORMS = {
     'coalesce': coalesce,
     'slugify': slugify,
@@ -87,3 +219,16 @@ TRANSFORMS = {
     'strip': str_func('strip'),
     'hash': hash
 }
+
+# Transforms which handle each value on its own can be applied to a whole
+# column of a batch at once. ``coalesce`` and ``join`` combine the values of
+# several columns and must be applied row by row.
+COLUMN_TRANSFORMS = {
+    'slugify': value_column('slugify'),
+    'clean': value_column('clean'),
+    'latinize': value_column('latinize'),
+    'upper': str_column('upper'),
+    'lower': str_column('lower'),
+    'strip': str_column('strip'),
+    'hash': hash_column
+}
@@ -1,14 +1,143 @@
 import os
+import sys
 import json
+from copy import deepcopy
+from hashlib import sha1
+from decimal import Decimal
+from datetime import date
+from collections import Mapping
+from json.encoder import encode_basestring, encode_basestring_ascii
 
+import six
 from jsonschema import Draft4Validator
 
+# The asyncio support in ``jsonmapping.aio`` uses async generators.
+ASYNC_SUPPORTED = sys.version_info >= (3, 6)
+
+# Upper bound on the number of mappings remembered as valid.
+VALIDATED_MAX = 1024
+
+_validator = None
+_validated = set()
+# Mapping objects validated before, by ID: the object and a copy of it.
+_validated_objects = {}
+
+
+def get_validator():
+    """ Load the mapping meta-schema and build its validator once per
+    process. """
+    global _validator
+    if _validator is None:
+        file_path = os.path.join(os.path.dirname(__file__),
+                                 'schemas', 'mapping.json')
+        with open(file_path, 'r') as fh:
+            _validator = Draft4Validator(json.load(fh))
+    return _validator
+
+
+def json_default(obj):
+    """ Serialize dates and decimals, which are produced by type casting.
+    Decimals become floats, as the stdlib JSON encoder cannot write them as
+    they are; ``ExactEncoder`` writes them exactly. """
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+class _HasDecimal(Exception):
+    pass
+
+
+class ExactEncoder(json.JSONEncoder):
+    """ A JSON encoder for mapped objects, which writes dates as ISO strings
+    and decimals as exact numbers, like ``CompiledMapper.dump_iter``.
+    Objects without decimals are left to the stdlib encoder, the others are
+    encoded in Python (without ``indent``). """
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            raise _HasDecimal()
+        return json_default(obj)
+
+    def encode(self, obj):
+        try:
+            return json.JSONEncoder.encode(self, obj)
+        except _HasDecimal:
+            return ''.join(self._iter_exact(obj))
+
+    def _key(self, key):
+        if isinstance(key, six.string_types):
+            return key
+        # Keys which are not strings are converted like the stdlib does:
+        return json.JSONEncoder.encode(self, key).strip('"')
+
+    def _iter_exact(self, obj):
+        if isinstance(obj, Decimal):
+            if obj.is_finite():
+                yield str(obj)
+            else:
+                yield json.JSONEncoder.encode(self, float(obj))
+        elif isinstance(obj, dict):
+            quote = encode_basestring_ascii if self.ensure_ascii \
+                else encode_basestring
+            items = obj.items()
+            if self.sort_keys:
+                items = sorted(items)
+            yield '{'
+            for i, (key, value) in enumerate(items):
+                if i:
+                    yield self.item_separator
+                yield quote(self._key(key))
+                yield self.key_separator
+                for chunk in self._iter_exact(value):
+                    yield chunk
+            yield '}'
+        elif isinstance(obj, (list, tuple)):
+            yield '['
+            for i, value in enumerate(obj):
+                if i:
+                    yield self.item_separator
+                for chunk in self._iter_exact(value):
+                    yield chunk
+            yield ']'
+        else:
+            yield json.JSONEncoder.encode(self, obj)
+
+
+def json_hashable(obj):
+    """ Serialize schema views (and other mappings) as dicts when hashing,
+    and anything else by its ``repr``. """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    return repr(obj)
+
+
+def content_hash(*objs):
+    """ Generate a stable SHA1 digest of the given JSON-style objects. """
+    digest = sha1()
+    for obj in objs:
+        data = json.dumps(obj, sort_keys=True, default=json_hashable)
+        digest.update(data.encode('utf-8'))
+    return digest.hexdigest()
+
 
 def validate_mapping(mapping):
-    """ Validate a mapping configuration file against the relevant schema. """
-    file_path = os.path.join(os.path.dirname(__file__),
-                             'schemas', 'mapping.json')
-    with open(file_path, 'r') as fh:
-        validator = Draft4Validator(json.load(fh))
-        validator.validate(mapping)
+    """ Validate a mapping configuration file against the relevant schema.
+    Mappings which have been validated before (by content) are skipped. The
+    same object is recognized by comparing it to a copy, which is cheaper
+    than hashing it again. """
+    seen = _validated_objects.get(id(mapping))
+    if seen is not None and seen[0] is mapping and seen[1] == mapping:
+        return mapping
+    key = content_hash(mapping)
+    if key not in _validated:
+        get_validator().validate(mapping)
+        if len(_validated) >= VALIDATED_MAX:
+            _validated.clear()
+        _validated.add(key)
+    if len(_validated_objects) >= VALIDATED_MAX:
+        _validated_objects.clear()
+    _validated_objects[id(mapping)] = (mapping, deepcopy(mapping))
     return mapping
@@ -1,7 +1,23 @@
+import re
 import six
 import typecast
+from decimal import Decimal
+from datetime import date, datetime
 
-from jsonmapping.transforms import TRANSFORMS
+from jsonmapping.transforms import TRANSFORMS, COLUMN_TRANSFORMS
+from jsonmapping.profiler import profile_transform, profile_value
+from jsonmapping.profiler import profile_column
+
+TYPES = ('date-time', 'date', 'decimal', 'integer', 'boolean', 'number',
+         'string')
+INTEGER = re.compile(r'^-?\d+$')
+NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+ISO_DATE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+ISO_DATE_TIME = re.compile(r'^(\d{4})-(\d{2})-(\d{2})[T ]'
+                           r'(\d{2}):(\d{2}):(\d{2})$')
+
+# Returned by the fast paths if a value needs to be handled by typecast.
+MISS = object()
 
 
 def extract_value(mapping, bind, data):
@@ -25,24 +41,239 @@ def extract_value(mapping, bind, data):
     return empty, convert_value(bind, value)
 
 
+def get_transforms(names, registry, profiler=None, path=None):
+    """ Look up transform functions by name, wrapping them for the profiler
+    if one is given. """
+    transforms = [registry[name] for name in names]
+    if profiler is not None:
+        transforms = [profile_transform(profiler, path, name, func)
+                      for (name, func) in zip(names, transforms)]
+    return transforms
+
+
+def typecast_failure(profiler, path):
+    """ Get a callback to report failed type casts to the profiler. """
+    if profiler is None:
+        return None
+
+    def on_failure(value):
+        profiler.typecast_failure(path, value)
+    return on_failure
+
+
+def compile_value(mapping, bind, profiler=None, path=None):
+    """ Pre-resolve the column accessors, transforms, format, default and
+    type cast of a value mapping once, and return a function which performs
+    the same work as ``extract_value`` for a single row of ``data``. If a
+    ``profiler`` is given, the node reports to it under ``path``. """
+    columns = mapping.get('columns', [mapping.get('column')])
+    transforms = get_transforms(mapping.get('transforms', []), TRANSFORMS,
+                                profiler=profiler, path=path)
+    format_str = mapping.get('format')
+    if is_empty(format_str):
+        format_str = None
+    default = mapping.get('default') or bind.schema.get('default')
+    convert = compile_converter(bind, typecast_failure(profiler, path))
+
+    def extract(data):
+        values = [data.get(c) for c in columns]
+        for transform in transforms:
+            values = list(transform(mapping, bind, values))
+
+        value = values[0] if len(values) else None
+        if format_str is not None:
+            value = format_str % tuple('' if v is None else v for v in values)
+
+        empty = is_empty(value)
+        if empty:
+            value = default
+        return empty, convert(value)
+
+    if profiler is not None:
+        return profile_value(profiler, path, extract)
+    return extract
+
+
 def get_type(bind):
     """ Detect the ideal type for the data, either using the explicit type
     definition or the format (for date, date-time, not supported by JSON). """
-    types = bind.types + [bind.schema.get('format')]
-    for type_name in ('date-time', 'date', 'decimal', 'integer', 'boolean',
-                      'number', 'string'):
-        if type_name in types:
+    format_ = bind.schema.get('format')
+    for type_name in TYPES:
+        if type_name == format_ or type_name in bind.types:
             return type_name
     return 'string'
 
 
 def convert_value(bind, value):
     """ Type casting. """
-    type_name = get_type(bind)
-    try:
-        return typecast.cast(type_name, value)
-    except typecast.ConverterError:
+    return compile_converter(bind)(value)
+
+
+def compile_column(mapping, bind, profiler=None, path=None):
+    """ Like ``compile_value``, but return a function which extracts the
+    value from a whole batch of column-oriented ``data`` at once. Leading
+    transforms which work on each value independently are applied to entire
+    columns; the remaining transforms are applied row by row. The function
+    returns a list of ``(empty, value)`` tuples, one for each row. """
+    columns = mapping.get('columns', [mapping.get('column')])
+    names = mapping.get('transforms', [])
+    split = 0
+    while split < len(names) and names[split] in COLUMN_TRANSFORMS:
+        split += 1
+    column_transforms = get_transforms(names[:split], COLUMN_TRANSFORMS,
+                                       profiler=profiler, path=path)
+    drop_nulls = 'hash' in names[:split]
+    row_transforms = get_transforms(names[split:], TRANSFORMS,
+                                    profiler=profiler, path=path)
+    format_str = mapping.get('format')
+    if is_empty(format_str):
+        format_str = None
+    default = mapping.get('default') or bind.schema.get('default')
+    convert_column = compile_column_converter(
+        bind, typecast_failure(profiler, path))
+
+    def extract(data, size):
+        cells = []
+        for column in columns:
+            cells.append(data.get(column))
+            if cells[-1] is None:
+                cells[-1] = [None] * size
+        for transform in column_transforms:
+            cells = [transform(mapping, bind, cell) for cell in cells]
+
+        empties, raw = [], []
+        for values in zip(*cells):
+            if drop_nulls:
+                values = [v for v in values if v is not None]
+            for transform in row_transforms:
+                values = list(transform(mapping, bind, values))
+
+            value = values[0] if len(values) else None
+            if format_str is not None:
+                value = format_str % tuple('' if v is None else v
+                                           for v in values)
+
+            empty = is_empty(value)
+            if empty:
+                value = default
+            empties.append(empty)
+            raw.append(value)
+        return list(zip(empties, convert_column(raw)))
+
+    if profiler is not None:
+        return profile_column(profiler, path, extract)
+    return extract
+
+
+def fast_integer(value):
+    if isinstance(value, six.integer_types) and not isinstance(value, bool):
+        return value
+    if isinstance(value, six.string_types) and INTEGER.match(value):
+        return int(value)
+    return MISS
+
+
+def fast_number(value):
+    if isinstance(value, float):
+        return value
+    if isinstance(value, six.string_types) and NUMBER.match(value):
+        return float(value)
+    return MISS
+
+
+def fast_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, six.string_types) and NUMBER.match(value):
+        return Decimal(value)
+    return MISS
+
+
+def fast_date(value):
+    if isinstance(value, six.string_types):
+        match = ISO_DATE.match(value)
+        if match is not None:
+            try:
+                return date(*[int(g) for g in match.groups()])
+            except ValueError:
+                return MISS
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    return MISS
+
+
+def fast_date_time(value):
+    if isinstance(value, six.string_types):
+        match = ISO_DATE_TIME.match(value)
+        if match is not None:
+            try:
+                return datetime(*[int(g) for g in match.groups()])
+            except ValueError:
+                return MISS
+    elif isinstance(value, datetime):
         return value
+    return MISS
+
+
+# Shortcuts for common, unambiguous input formats, which give the same
+# result as ``typecast.cast`` without its per-value overhead.
+FAST_PATHS = {
+    'integer': fast_integer,
+    'number': fast_number,
+    'decimal': fast_decimal,
+    'date': fast_date,
+    'date-time': fast_date_time
+}
+
+
+def compile_converter(bind, on_failure=None):
+    """ Return a type casting function with the target type resolved. The
+    optional ``on_failure`` callback is given each value which cannot be
+    converted. """
+    type_name = get_type(bind)
+    fast = FAST_PATHS.get(type_name)
+
+    def convert(value):
+        if value is None:
+            return None
+        if fast is not None:
+            result = fast(value)
+            if result is not MISS:
+                return result
+        try:
+            return typecast.cast(type_name, value)
+        except typecast.ConverterError:
+            if on_failure is not None:
+                on_failure(value)
+            return value
+    return convert
+
+
+def compile_column_converter(bind, on_failure=None):
+    """ Return a function which type casts a whole column of values. Each
+    distinct string is only converted once per column, so that repeated
+    values (and repeated failures on dirty data) are cheap. Values which
+    cannot be converted are returned unchanged. """
+    convert = compile_converter(bind, on_failure=on_failure)
+
+    def convert_column(values):
+        seen = {}
+        results = []
+        for value in values:
+            if isinstance(value, six.string_types):
+                result = seen.get(value, MISS)
+                if result is MISS:
+                    result = seen[value] = convert(value)
+            else:
+                result = convert(value)
+            results.append(result)
+        return results
+    return convert_column
+
+
+def convert_column(bind, values):
+    """ Type cast a column of values in bulk, see ``convert_value``. """
+    return compile_column_converter(bind)(values)
 
 
 def is_empty(value):
@@ -1,30 +1,100 @@
-from copy import deepcopy
+from collections import Mapping, OrderedDict
+
+from six.moves import intern
+from six.moves.urllib.parse import urljoin
 
 
 def property_sorter(prop):
     return (prop.sort_index * -1, prop.name, prop.id)
 
 
+class SchemaView(Mapping):
+    """ A read-only view of a schema with a ``$ref`` merged with the schema it
+    refers to, without copying either. Keys of the resolved schema take
+    precedence over those of the referring one, and ``$ref`` itself is
+    hidden. Both schemas must not be changed while the view is in use. """
+    __slots__ = ('resolved', 'referring')
+
+    def __init__(self, resolved, referring):
+        self.resolved = resolved
+        self.referring = referring
+
+    def __getitem__(self, key):
+        if key in self.resolved:
+            return self.resolved[key]
+        if key != '$ref':
+            return self.referring[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self.resolved:
+            return self.resolved[key]
+        if key != '$ref':
+            return self.referring.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        if key in self.resolved:
+            return True
+        return key != '$ref' and key in self.referring
+
+    def __iter__(self):
+        for key in self.resolved:
+            yield key
+        for key in self.referring:
+            if key != '$ref' and key not in self.resolved:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __getstate__(self):
+        return (self.resolved, self.referring)
+
+    def __setstate__(self, state):
+        self.resolved, self.referring = state
+
+    def __repr__(self):
+        return '<SchemaView(%r)>' % dict(self)
+
+
+def intern_name(value):
+    """ Intern names and paths, which repeat across many visitors. Only
+    native strings can be interned on Python 2. """
+    if isinstance(value, str):
+        return intern(value)
+    return value
+
+
 class SchemaVisitor(object):
     """ A schema visitor traverses a JSON schema with associated data and
     allows the user to perform any transformations on the data that they
-    wish. """
+    wish.
+
+    Visitors are built in large numbers, so they use ``__slots__`` and the
+    attributes derived from the schema (``path``, ``title``, ``plural``,
+    ``graph``, ``inline`` and ``sort_index``) are computed once, when the
+    visitor is built. Subclasses should declare ``__slots__`` for any extra
+    state to keep the memory saving; without them, instances get a
+    ``__dict__`` and work as usual. """
+    __slots__ = ('cls', 'name', 'parent', 'resolver', 'schema', 'id',
+                 'inherited', 'types', 'is_object', 'is_array', 'is_value',
+                 'scope', 'path', 'title', 'plural', 'graph', 'inline',
+                 'sort_index', '_properties', '_items')
 
     def __init__(self, schema, resolver, name=None, parent=None, scope=None):
         self.cls = type(self)
-        self.name = name
+        self.name = intern_name(name)
         self.parent = parent
         self.resolver = resolver
 
         if '$ref' in schema:
             with resolver.in_scope(scope):
                 uri, schema_ = resolver.resolve(schema.get('$ref'))
-                schema = deepcopy(schema)
-                schema.pop('$ref', None)
-                schema.update(schema_)
+                schema = SchemaView(schema_, schema)
 
         self.schema = schema
-        self.id = schema.get('id')
+        self.id = intern_name(schema.get('id'))
 
         self.inherited = []
         for inheritance_rule in ('anyOf', 'allOf', 'oneOf'):
@@ -33,9 +103,8 @@ class SchemaVisitor(object):
                                    parent=self.parent)
                 self.inherited.append(visitor)
 
-        self.types = schema.get('type')
-        if not isinstance(self.types, list):
-            self.types = [self.types]
+        types = schema.get('type')
+        self.types = list(types) if isinstance(types, list) else [types]
         for visitor in self.inherited:
             for type_ in visitor.types:
                 if type_ not in self.types:
@@ -53,39 +122,28 @@ class SchemaVisitor(object):
         else:
             self.scope = scope
 
+        self.path = intern_name(self._get_path())
+        self.title = self.schema.get('title', self.name)
+        self.plural = self.schema.get('plural', self.title)
+        # This is used to infer the graph role of a particular schema. It can
+        # either be 'edge' or 'node'.
+        self.graph = self.schema.get('graph') if self.is_object else None
+        self.inline = self.is_value or self.schema.get('inline', False)
+        self.sort_index = self.schema.get('sortIndex', 0)
+
+    @classmethod
+    def cached(cls, schema, resolver, scope=None):
+        """ Get a visitor for ``schema`` from the shared registry, so that
+        visitor trees for referenced schemas are only built once. """
+        return visitors.get(cls, schema, resolver, scope=scope)
+
     def match(self, name):
         return self.name == name
 
-    @property
-    def title(self):
-        return self.schema.get('title', self.name)
-
-    @property
-    def plural(self):
-        return self.schema.get('plural', self.title)
-
-    @property
-    def graph(self):
-        """ This is used to infer the graph role of a particular schema.
-        It can either be 'edge' or 'node'. """
-        if self.is_object:
-            return self.schema.get('graph')
-
-    @property
-    def inline(self):
-        if self.is_value:
-            return True
-        return self.schema.get('inline', False)
-
-    @property
-    def sort_index(self):
-        return self.schema.get('sortIndex', 0)
-
-    @property
-    def path(self):
+    def _get_path(self):
         if self.id is not None:
             return self.id
-        if self.parent:
+        if self.parent and self.parent.path is not None:
             path = self.parent.path
             if self.name:
                 if '#' not in path:
@@ -126,3 +184,48 @@ class SchemaVisitor(object):
 
     def __repr__(self):
         return '<SchemaVisitor(%r,%r)>' % (self.name, self.title)
+
+
+class VisitorCache(object):
+    """ A bounded registry of visitors built from schemas which are only a
+    reference (``{'$ref': uri}``), keyed by the visitor class, the resolved
+    URI, the name and the path of the parent. Visitor trees compute their
+    properties lazily and keep them, so sharing them means each subtree is
+    built only once. Other schemas are not cached. """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._visitors = OrderedDict()
+
+    def get(self, cls, schema, resolver, name=None, parent=None, scope=None):
+        if not isinstance(schema, dict) or list(schema.keys()) != ['$ref']:
+            return cls(schema, resolver, name=name, parent=parent,
+                       scope=scope)
+        with resolver.in_scope(scope):
+            uri = urljoin(resolver.resolution_scope, schema['$ref'])
+        parent_path = parent.path if parent is not None else None
+        key = (cls, id(resolver), uri, name, parent_path)
+        visitor = self._visitors.pop(key, None)
+        if visitor is None or visitor.resolver is not resolver:
+            visitor = cls(schema, resolver, name=name, parent=parent,
+                          scope=scope)
+        self._visitors[key] = visitor
+        while len(self._visitors) > self.maxsize:
+            self._visitors.popitem(last=False)
+        return visitor
+
+    def invalidate(self, resolver=None):
+        """ Drop the cached visitors built with ``resolver``, or all of them.
+        This must be called when the schemas in a resolver store change. """
+        if resolver is None:
+            self._visitors.clear()
+            return
+        for key, visitor in list(self._visitors.items()):
+            if visitor.resolver is resolver:
+                self._visitors.pop(key)
+
+    def __len__(self):
+        return len(self._visitors)
+
+
+visitors = VisitorCache()
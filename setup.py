@@ -21,7 +21,8 @@ setup(
     author_email='friedrich@pudo.org',
     url='http://github.com/pudo/jsonmapping',
     license='MIT',
-    packages=find_packages(exclude=['ez_setup', 'examples', 'test']),
+    packages=find_packages(exclude=['ez_setup', 'examples', 'test',
+                                    'benchmarks']),
     namespace_packages=[],
     package_data={
         '': ['jsonmapping/schemas/*.json']
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from copy import deepcopy
+from unittest import TestCase
+
+from jsonmapping.delta import apply_delta, DeltaStore
+from jsonmapping.delta import NEW, CHANGED, DELETED
+from .util import resolver, create_resolver, fixture_uri
+
+
+class DeltaTestCase(TestCase):
+
+    def setUp(self):
+        super(DeltaTestCase, self).setUp()
+        self.mapping, self.uri = fixture_uri('countries/mapping.json')
+        resolver.store[self.uri] = self.mapping
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'delta.sqlite')
+        self.rows = [
+            {'iso2': 'DE', 'iso3': 'DEU', 'country': 'Germany'},
+            {'iso2': 'FR', 'iso3': 'FRA', 'country': 'France'},
+            {'iso2': 'IT', 'iso3': 'ITA', 'country': 'Italy'}
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def delta(self, rows, mapping=None, resolver=resolver):
+        return list(apply_delta(rows, mapping or self.mapping, resolver,
+                                self.path, 'iso2', scope=self.uri))
+
+    def test_delta_runs(self):
+        changes = self.delta(self.rows)
+        assert [c[0] for c in changes] == [NEW, NEW, NEW], changes
+        assert changes[0][2]['name'] == 'Germany', changes
+        assert self.delta(self.rows) == []
+
+        rows = [dict(r) for r in self.rows[:2]]
+        rows[1]['country'] = 'French Republic'
+        rows[0]['modified'] = 'not used by the mapping'
+        rows.append({'iso2': 'ES', 'iso3': 'ESP', 'country': 'Spain'})
+        changes = self.delta(rows)
+        statuses = [(status, key) for (status, key, _) in changes]
+        assert statuses == [(CHANGED, 'FR'), (NEW, 'ES'), (DELETED, 'IT')]
+        assert changes[2][2] is None, changes
+        assert changes[0][2]['name'] == 'French Republic', changes
+
+    def test_mapping_change(self):
+        self.delta(self.rows)
+        # Resolved references are cached by the resolver, so the changed
+        # mapping needs a resolver of its own.
+        mapping = deepcopy(self.mapping)
+        model = mapping['definitions']['mappingModel']
+        model['mapping']['iso2'] = {'column': 'iso2',
+                                    'transforms': ['lower']}
+        changed = create_resolver()
+        changed.store[self.uri] = mapping
+        changes = self.delta(self.rows, mapping=mapping, resolver=changed)
+        assert [c[0] for c in changes] == [CHANGED] * 3, changes
+        assert changes[0][2]['iso2'] == 'de', changes
+
+    def test_interrupted_run(self):
+        changes = apply_delta(self.rows, self.mapping, resolver, self.path,
+                              'iso2', scope=self.uri)
+        next(changes)
+        changes.close()
+        assert len(self.delta(self.rows)) == 3
+
+    def test_many_fingerprints(self):
+        store = DeltaStore(self.path)
+        keys = ['k%d' % i for i in range(2500)]
+        store.update(1, [(k, k.upper()) for k in keys])
+        fingerprints = store.fingerprints(keys + ['missing'])
+        assert len(fingerprints) == len(keys), len(fingerprints)
+        assert fingerprints['k2499'] == 'K2499', fingerprints['k2499']
+        store.close()
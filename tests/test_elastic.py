@@ -0,0 +1,152 @@
+import os
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from copy import deepcopy
+from unittest import TestCase
+
+from decimal import Decimal
+from datetime import date
+
+from jsonmapping.visitor import SchemaVisitor
+from jsonmapping.elastic import generate_schema_mapping, write_bulk
+from .util import create_resolver, BASE_URI
+
+PERSON_URI = BASE_URI + '/person.json#'
+
+
+class ElasticTestCase(TestCase):
+
+    def setUp(self):
+        super(ElasticTestCase, self).setUp()
+        self.resolver = create_resolver()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_generate_mapping(self):
+        mapping = generate_schema_mapping(self.resolver, PERSON_URI, depth=4)
+        assert mapping['type'] == 'object', mapping
+        membership = mapping['properties']['memberships']
+        assert membership['type'] == 'nested', membership
+        # The cycle back to person is not expanded:
+        person = membership['properties']['person']
+        assert set(person['properties']) == set(['id', '$schema']), person
+        org = membership['properties']['organization']
+        assert 'name' in org['properties'], org
+        created = mapping['properties']['created_at']
+        assert created['type'] == 'date', created
+
+        # No part of the mapping is shared with another:
+        seen, parts = set(), [mapping]
+        while len(parts):
+            part = parts.pop()
+            assert id(part) not in seen, part
+            seen.add(id(part))
+            parts.extend(v for v in part.values() if isinstance(v, dict))
+
+    def test_cache_dir(self):
+        mapping = generate_schema_mapping(self.resolver, PERSON_URI,
+                                          depth=2, cache_dir=self.dir)
+        files = os.listdir(self.dir)
+        assert len(files) == 1, files
+        path = os.path.join(self.dir, files[0])
+        with open(path, 'r') as fh:
+            assert json.load(fh) == mapping
+        with open(path, 'w') as fh:
+            json.dump({'cached': True}, fh)
+        cached = generate_schema_mapping(self.resolver, PERSON_URI,
+                                         depth=2, cache_dir=self.dir)
+        assert cached == {'cached': True}, cached
+
+        # Changing the schemas invalidates the cache:
+        self.resolver.store['http://example.com/extra.json'] = {}
+        changed = generate_schema_mapping(self.resolver, PERSON_URI,
+                                          depth=2, cache_dir=self.dir)
+        assert changed == mapping, changed
+
+        # Visitors cached for the old version of a schema are not used:
+        SchemaVisitor.cached({'$ref': PERSON_URI}, self.resolver)
+        person = deepcopy(self.resolver.store[PERSON_URI])
+        person['properties']['nickname'] = {'type': 'string'}
+        self.resolver.store[PERSON_URI] = person
+        changed = generate_schema_mapping(self.resolver, PERSON_URI,
+                                          depth=2, cache_dir=self.dir)
+        assert 'nickname' in changed['properties'], changed
+
+    def test_bulk_coercion(self):
+        mapping = {
+            'type': 'object',
+            '_id': {'path': 'id'},
+            'properties': {
+                'id': {'type': 'string'},
+                'count': {'type': 'long'},
+                'share': {'type': 'float'},
+                'active': {'type': 'boolean'},
+                'born': {'type': 'date', 'format': 'dateOptionalTime'},
+                'child': {
+                    'type': 'nested',
+                    'properties': {'count': {'type': 'long'}}
+                }
+            }
+        }
+        obj = {'id': 5, 'count': '12', 'share': '0.5', 'active': 'no',
+               'born': date(1980, 1, 2), 'extra': 'x',
+               'child': [{'count': '1'}, {'count': 'many'}]}
+        fh = BytesIO()
+        assert write_bulk([obj], mapping, 'test', fh, doc_type='doc') == 1
+        lines = fh.getvalue().decode('utf-8').splitlines()
+        assert len(lines) == 2, lines
+        action = json.loads(lines[0])
+        assert action == {'index': {'_index': 'test', '_type': 'doc',
+                                    '_id': '5'}}, action
+        doc = json.loads(lines[1])
+        assert doc['count'] == 12, doc
+        assert doc['share'] == 0.5, doc
+        assert doc['active'] is False, doc
+        assert doc['born'] == '1980-01-02', doc
+        assert doc['extra'] == 'x', doc
+        assert doc['child'] == [{'count': 1}, {'count': None}], doc
+
+    def test_bulk_coercion_failures(self):
+        mapping = {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'long'},
+                'share': {'type': 'float'},
+                'born': {'type': 'date', 'format': 'dateOptionalTime'}
+            }
+        }
+        objs = [
+            {'count': '1e999', 'share': 'nan', 'born': 'yesterday'},
+            {'count': Decimal('Infinity'), 'share': 'inf',
+             'born': '2015-13-45'},
+            {'count': '7', 'share': '-Infinity',
+             'born': '2015-01-02T10:20:30.5Z'}
+        ]
+        fh = BytesIO()
+        write_bulk(objs, mapping, 'test', fh)
+        lines = fh.getvalue().decode('utf-8').splitlines()
+        docs = [json.loads(line) for line in lines[1::2]]
+        assert docs[0] == {'count': None, 'share': None,
+                           'born': None}, docs
+        assert docs[1] == {'count': None, 'share': None,
+                           'born': None}, docs
+        assert docs[2] == {'count': 7, 'share': None,
+                           'born': '2015-01-02T10:20:30.5Z'}, docs
+
+    def test_bulk_batches(self):
+        mapping = generate_schema_mapping(self.resolver, PERSON_URI)
+        objs = [{'id': 'p%02d' % i, 'name': 'Person %02d' % i}
+                for i in range(25)]
+        batches = []
+        write_bulk(objs, mapping, 'test', batches.append, max_docs=10)
+        assert [b.count(b'\n') for b in batches] == [20, 20, 10], batches
+        size = len(batches[0]) // 10
+        batches = []
+        write_bulk(objs, mapping, 'test', batches.append,
+                   max_bytes=size * 3 + 5)
+        assert len(batches) == 9, len(batches)
+        assert all(len(b) <= size * 3 + 5 for b in batches)
@@ -0,0 +1,53 @@
+import io
+from unittest import TestCase
+
+from jsonmapping.io import read_csv, read_jsonl, map_csv, JSONLinesWriter
+from .util import resolver, fixture_uri, fixture_file, csv_mapper
+
+
+class IOTestCase(TestCase):
+
+    def setUp(self):
+        super(IOTestCase, self).setUp()
+        self.mapping, self.uri = fixture_uri('countries/mapping.json')
+        resolver.store[self.uri] = self.mapping
+
+    def test_read_csv_projection(self):
+        fh = fixture_file('countries/countries.csv')
+        rows = list(read_csv(fh, columns=set(['iso2', 'country'])))
+        assert len(rows) == 255, len(rows)
+        assert set(rows[1].keys()) == set(['iso2', 'country']), rows[1]
+        assert rows[1]['iso2'] == 'AF', rows[1]
+
+    def test_read_csv_short_rows(self):
+        fh = io.StringIO(u'a,b,c\n1,2,3\n\n4\n')
+        rows = list(read_csv(fh))
+        assert len(rows) == 2, rows
+        assert rows[1] == {'a': '4', 'b': None, 'c': None}, rows[1]
+
+    def test_read_csv_no_columns(self):
+        fh = io.StringIO(u'a,b\n1,2\n')
+        rows = list(read_csv(fh, columns=set()))
+        assert rows == [{}], rows
+
+    def test_read_csv_unicode(self):
+        fh = io.BytesIO(u'name\nM\xfcnchen\n'.encode('utf-8'))
+        rows = list(read_csv(fh))
+        assert rows == [{'name': u'M\xfcnchen'}], rows
+
+    def test_map_csv(self):
+        expected = list(csv_mapper(fixture_file('countries/countries.csv'),
+                                   self.mapping, resolver=resolver,
+                                   scope=self.uri))
+        mapped = list(map_csv(fixture_file('countries/countries.csv'),
+                              self.mapping, resolver, scope=self.uri))
+        assert mapped == expected, mapped
+
+    def test_jsonl_roundtrip(self):
+        objs = list(map_csv(fixture_file('countries/countries.csv'),
+                            self.mapping, resolver, scope=self.uri))
+        fh = io.BytesIO()
+        with JSONLinesWriter(fh, buffer_lines=100) as writer:
+            writer.write_many(objs)
+        fh.seek(0)
+        assert list(read_jsonl(fh)) == objs
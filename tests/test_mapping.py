@@ -1,4 +1,17 @@
-from unittest import TestCase
+import json
+import threading
+from io import BytesIO
+from decimal import Decimal
+from datetime import date
+from unittest import TestCase, SkipTest
+
+import unicodecsv
+from nose.tools import raises
+from jsonschema import ValidationError
+
+from jsonmapping import Mapper, SchemaVisitor
+from jsonmapping.io import JSONLinesWriter
+from jsonmapping.util import json_default, ASYNC_SUPPORTED
 
 from .util import resolver, fixture_uri, fixture_file, csv_mapper
 
@@ -28,3 +41,272 @@ class MappingTestCase(TestCase):
         assert isinstance(row0, dict), row0
         print(row0)
         assert row0['id'].startswith('popolo:person:'), row0
+
+    def test_compiled_matches_apply(self):
+        mapping, uri = fixture_uri('everypol/mapping.json')
+        resolver.store[uri] = mapping
+        mapper = Mapper(mapping, resolver)
+        compiled = mapper.compile()
+        assert compiled is mapper.compile()
+        csvobj = fixture_file('everypol/term-26.csv')
+        for row in unicodecsv.DictReader(csvobj):
+            assert compiled.apply(row) == mapper.apply(row), row
+
+    def test_compiled_inline_schema(self):
+        mapping = {
+            'schema': {
+                'type': 'object',
+                'properties': {'a': {'type': 'string'}}
+            },
+            'mapping': {'a': {'column': 'a'}}
+        }
+        mapper = Mapper(mapping, resolver)
+        compiled = mapper.compile()
+        for row in [{}, {'a': 'x'}]:
+            expected = mapper.apply(row)
+            assert expected[1]['$schema'] is None, expected
+            assert compiled.apply(row) == expected, row
+            assert compiled.apply_batch({'a': [row.get('a')]}) == \
+                [expected[1]]
+            buf = bytearray()
+            compiled.write(row, buf)
+            assert json.loads(buf.decode('ascii')) == expected[1], buf
+
+    def test_validator_is_cached(self):
+        from jsonmapping.util import get_validator, validate_mapping
+        assert get_validator() is get_validator()
+        mapping, _ = fixture_uri('everypol/mapping.json')
+        assert validate_mapping(mapping) is mapping
+        assert validate_mapping(mapping) is mapping
+        # Changes to a mapping which was validated before are noticed:
+        del mapping['mapping']
+        try:
+            validate_mapping(mapping)
+            assert False, 'Changed mapping was not validated'
+        except ValidationError:
+            pass
+
+    @raises(ValidationError)
+    def test_invalid_mapping(self):
+        Mapper({'schema': {'type': 'object'}}, resolver)
+
+    def test_skip_validation(self):
+        mapper = Mapper({'schema': {'type': 'object'}}, resolver,
+                        validate=False)
+        assert mapper.apply({}) == (True, {'$schema': None}), mapper
+
+    def test_apply_batch(self):
+        mapping, uri = fixture_uri('everypol/mapping.json')
+        resolver.store[uri] = mapping
+        mapper = Mapper(mapping, resolver)
+        rows = list(unicodecsv.DictReader(
+            fixture_file('everypol/term-26.csv')))
+        columns = {}
+        for row in rows:
+            for key, value in row.items():
+                columns.setdefault(key, []).append(value)
+        mapped = mapper.apply_batch(columns)
+        assert len(mapped) == len(rows), len(mapped)
+        for row, obj in zip(rows, mapped):
+            assert obj == mapper.apply(row)[1], obj
+
+    @raises(ValueError)
+    def test_apply_batch_uneven(self):
+        mapping, uri = fixture_uri('countries/mapping.json')
+        resolver.store[uri] = mapping
+        mapper = Mapper(mapping, resolver, scope=uri)
+        mapper.apply_batch({'iso2': ['DE', 'FR'], 'iso3': ['DEU']})
+
+    def test_apply_parallel(self):
+        mapping, uri = fixture_uri('countries/mapping.json')
+        resolver.store[uri] = mapping
+        rows = list(unicodecsv.DictReader(
+            fixture_file('countries/countries.csv')))
+        expected = list(Mapper.apply_iter(rows, mapping, resolver,
+                                          scope=uri))
+        mapped = list(Mapper.apply_parallel(rows, mapping, resolver,
+                                            scope=uri, workers=2,
+                                            chunksize=20))
+        assert mapped == expected, mapped
+        mapped = list(Mapper.apply_parallel(iter(rows), mapping, resolver,
+                                            scope=uri, workers=2,
+                                            chunksize=20, ordered=False))
+        assert len(mapped) == len(expected), len(mapped)
+        for obj in mapped:
+            assert obj in expected, obj
+
+    def test_dump_iter(self):
+        mapping, uri = fixture_uri('everypol/mapping.json')
+        resolver.store[uri] = mapping
+        rows = list(unicodecsv.DictReader(
+            fixture_file('everypol/term-26.csv')))
+        expected = [json.loads(json.dumps(obj, default=json_default))
+                    for obj in Mapper.apply_iter(rows, mapping, resolver)]
+
+        buf = bytearray()
+        assert Mapper.dump_iter(rows, mapping, resolver, buf) == len(rows)
+        lines = buf.decode('ascii').splitlines()
+        assert [json.loads(l) for l in lines] == expected
+
+        blocks = []
+        Mapper(mapping, resolver).compile().dump_iter(rows, blocks.append,
+                                                      buffer_size=100)
+        assert len(blocks) > 1, len(blocks)
+        assert b''.join(blocks) == bytes(buf)
+
+        fh = BytesIO()
+        Mapper.dump_iter(rows, mapping, resolver, fh)
+        assert fh.getvalue() == bytes(buf)
+
+        mapping = {
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'price': {'type': 'string', 'format': 'decimal'},
+                    'sold': {'type': 'string', 'format': 'date'}
+                }
+            },
+            'mapping': {
+                'price': {'column': 'price'},
+                'sold': {'column': 'sold'}
+            }
+        }
+        buf = bytearray()
+        rows = [{'price': '0.10000000000000000001', 'sold': '2015-01-02'},
+                {'price': ''}]
+        Mapper.dump_iter(rows, mapping, resolver, buf)
+        lines = buf.decode('ascii').splitlines()
+        assert '"price":0.10000000000000000001' in lines[0], lines
+        assert json.loads(lines[1])['price'] is None, lines
+        # The same bytes are written by the JSON Lines writer:
+        fh = BytesIO()
+        writer = JSONLinesWriter(fh)
+        writer.write_many(Mapper.apply_iter(rows, mapping, resolver))
+        writer.close()
+        assert fh.getvalue() == bytes(buf), (fh.getvalue(), buf)
+        assert json.loads(json.dumps(Decimal('1.25'),
+                                     default=json_default)) == 1.25
+
+    def test_write_optional(self):
+        mapping, uri = fixture_uri('countries/mapping.json')
+        resolver.store[uri] = mapping
+        compiled = Mapper(mapping, resolver, scope=uri).compile()
+        rows = [{}, {'iso2': 'DE'}, {'iso2': 'FR', 'country': u'Fr\xe4nce'}]
+        for row in rows:
+            buf = bytearray()
+            empty = compiled.write(row, buf)
+            expected_empty, obj = compiled.apply(row)
+            assert empty == expected_empty, row
+            assert json.loads(buf.decode('ascii')) == obj, (buf, obj)
+
+    def test_apply_aiter(self):
+        if not ASYNC_SUPPORTED:
+            raise SkipTest('asyncio support requires Python 3.6')
+        import asyncio
+        mapping, uri = fixture_uri('countries/mapping.json')
+        resolver.store[uri] = mapping
+        rows = list(unicodecsv.DictReader(
+            fixture_file('countries/countries.csv')))
+        expected = list(Mapper.apply_iter(rows, mapping, resolver,
+                                          scope=uri))
+        loop = asyncio.new_event_loop()
+
+        class Source(object):
+            def __init__(self):
+                self.rows = iter(rows)
+
+            def __aiter__(self):
+                return self
+
+            def __anext__(self):
+                for row in self.rows:
+                    future = loop.create_future()
+                    future.set_result(row)
+                    return future
+                raise StopAsyncIteration()  # noqa
+
+        try:
+            for executor in (None, 'thread', 'process'):
+                objs = Mapper.apply_aiter(Source(), mapping, resolver,
+                                          scope=uri, batch_size=20,
+                                          executor=executor)
+                mapped = []
+                while True:
+                    try:
+                        obj = loop.run_until_complete(objs.__anext__())
+                    except StopAsyncIteration:  # noqa
+                        break
+                    mapped.append(obj)
+                assert mapped == expected, executor
+        finally:
+            loop.close()
+
+    def test_transform_cache(self):
+        from jsonmapping import transforms
+        transforms.configure_cache(maxsize=2)
+        try:
+            values = ['Foo Bar', 'Foo Bar', None, 'Qux', 'Quux', 'Foo Bar']
+            slugs = list(transforms.slugify({}, None, values))
+            assert slugs == ['foo-bar', 'foo-bar', None, 'qux', 'quux',
+                             'foo-bar'], slugs
+            stats = transforms.cache_stats()['slugify']
+            assert stats == {'hits': 1, 'misses': 4, 'size': 2}, stats
+            list(transforms.slugify({'cache': False}, None, values))
+            assert transforms.cache_stats()['slugify'] == stats
+            transforms.configure_cache(maxsize=0)
+            slugs = list(transforms.slugify({}, None, values))
+            assert slugs[-1] == 'foo-bar', slugs
+            stats = transforms.cache_stats()['slugify']
+            assert stats == {'hits': 0, 'misses': 0, 'size': 0}, stats
+
+            # The cache is shared by threads, e.g. of ``apply_aiter``:
+            cache = transforms.TransformCache(lambda v: v.upper(), maxsize=2)
+            values = ['v%d' % (i % 5) for i in range(2000)]
+            errors = []
+
+            def work():
+                try:
+                    for value in values:
+                        assert cache(value) == value.upper()
+                except Exception as exc:
+                    errors.append(exc)
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert not len(errors), errors
+            assert cache.stats()['size'] <= 2, cache.stats()
+        finally:
+            transforms.configure_cache(enabled=False)
+        list(transforms.slugify({'cache': True}, None, values))
+        assert 'slugify' in transforms.cache_stats()
+        transforms.configure_cache(enabled=False)
+
+    def test_convert_column(self):
+        from jsonmapping.value import convert_column, convert_value
+        bind = SchemaVisitor({'type': 'string', 'format': 'date'}, resolver)
+        raw = ['2015-01-02', '2015-01-02', 'no date', None]
+        values = convert_column(bind, raw)
+        assert values[0] == date(2015, 1, 2), values
+        assert values[1] == values[0], values
+        assert values[2] == 'no date', values
+        assert values[3] is None, values
+        assert values == [convert_value(bind, v) for v in raw], values
+        bind = SchemaVisitor({'type': 'integer'}, resolver)
+        assert convert_column(bind, ['12', 7, '-3']) == [12, 7, -3]
+
+    def test_profiler(self):
+        from jsonmapping.profiler import MappingProfiler
+        mapping, uri = fixture_uri('everypol/mapping.json')
+        resolver.store[uri] = mapping
+        profiler = MappingProfiler()
+        csvobj = fixture_file('everypol/term-26.csv')
+        reader = unicodecsv.DictReader(csvobj)
+        mapped = list(Mapper.apply_iter(reader, mapping, resolver,
+                                        profiler=profiler))
+        nodes = dict((n['path'], n) for n in profiler.report())
+        assert nodes['name']['calls'] == len(mapped), nodes['name']
+        assert 'slugify' in nodes['id']['transforms'], nodes['id']
+        assert nodes['contact_details[1]']['skipped'] > 0, nodes
+        assert 'memberships/organization/name' in nodes, nodes.keys()
@@ -1,8 +1,12 @@
+import csv
+import json
 from unittest import TestCase
+from xml.etree import ElementTree
+from six import StringIO
 from nose.tools import raises
 from pprint import pprint  # noqa
 
-from jsonmapping.network import Network
+from jsonmapping.network import Network, NetworkShard, AdjacencyBackend
 from .util import resolver, fixture_uri, fixture_file, csv_mapper
 
 
@@ -31,3 +35,130 @@ class NetworkTestCase(TestCase):
         assert len(d3_data['links']), d3_data['links']
 
         # assert False
+
+    def test_add_many_adjacency(self):
+        objs = list(csv_mapper(self.csvobj, self.mapping, resolver=resolver))
+        network = Network(resolver)
+        for obj in objs:
+            network.add(obj)
+        compact = Network(resolver, backend=AdjacencyBackend())
+        compact.add_many(objs)
+        assert compact.edge_ids == network.edge_ids
+        expected, data = network.to_dict(), compact.to_dict()
+        assert len(data['nodes']) == len(expected['nodes']), data['nodes']
+        assert len(data['links']) == len(expected['links']), data['links']
+        graph = compact.to_networkx()
+        assert graph.number_of_edges() == len(expected['links'])
+        assert network.graph is network.backend.graph
+        assert network.to_networkx() is network.graph
+
+    def test_export_formats(self):
+        objs = list(csv_mapper(self.csvobj, self.mapping, resolver=resolver))
+        network = Network(resolver, backend=AdjacencyBackend())
+        network.add_many(objs)
+        expected = network.to_dict()
+
+        fh = StringIO()
+        network.export(fh, format='jsonl')
+        lines = [json.loads(l) for l in fh.getvalue().splitlines()]
+        nodes = [l for l in lines if l['$graph'] == 'node']
+        assert len(nodes) == len(expected['nodes']), nodes
+        assert len(lines) - len(nodes) == len(expected['links'])
+
+        fh = StringIO()
+        network.export(fh, format='node-link')
+        data = json.loads(fh.getvalue())
+        assert len(data['links']) == len(expected['links'])
+
+        fh = StringIO()
+        network.export(fh, format='graphml')
+        doc = ElementTree.fromstring(fh.getvalue().encode('utf-8'))
+        ns = '{http://graphml.graphdrawing.org/xmlns}'
+        edges = doc.findall('%sgraph/%sedge' % (ns, ns))
+        assert len(edges) == len(expected['links']), len(edges)
+
+        fh = StringIO()
+        network.export(fh, format='csv')
+        rows = list(csv.reader(StringIO(fh.getvalue())))
+        assert rows[0] == ['source', 'target', 'id', '$schema'], rows[0]
+        assert len(rows) == len(expected['links']) + 1
+
+    def test_flush(self):
+        objs = list(csv_mapper(self.csvobj, self.mapping, resolver=resolver))
+        network = Network(resolver, backend=AdjacencyBackend())
+        network.add_many(objs)
+        expected = network.to_dict()
+
+        network = Network(resolver, backend=AdjacencyBackend())
+        fh = StringIO()
+        half = len(objs) // 2
+        network.add_many(objs[:half])
+        network.flush(fh)
+        assert not len(network.backend.edge_attrs)
+        network.add_many(objs[half:])
+        network.flush(fh)
+        lines = [json.loads(l) for l in fh.getvalue().splitlines()]
+        nodes = [l['id'] for l in lines if l['$graph'] == 'node']
+        assert len(nodes) == len(set(nodes)), nodes
+        assert len(nodes) == len(expected['nodes'])
+        assert len(lines) - len(nodes) == len(expected['links'])
+
+    @raises(ValueError)
+    def test_flush_graphml(self):
+        network = Network(resolver)
+        network.flush(StringIO(), format='graphml')
+
+    def test_merge_shards(self):
+        objs = list(csv_mapper(self.csvobj, self.mapping, resolver=resolver))
+        network = Network(resolver, backend=AdjacencyBackend())
+        network.add_many(objs)
+        merged = Network(resolver, backend=AdjacencyBackend())
+        half = len(objs) // 2
+        for shard_objs in (objs[:half], objs[half:]):
+            shard = NetworkShard(resolver)
+            shard.add_many(shard_objs)
+            merged.merge(shard.state())
+        assert merged.edge_ids == network.edge_ids
+        assert merged.backend.nodes == network.backend.nodes
+        assert merged.backend.node_attrs == network.backend.node_attrs
+
+    def test_merge_dangling(self):
+        attrs = {'id': 'm1'}
+        left = NetworkShard(resolver)
+        left._add_dangling('m1', 'a', attrs)
+        right = NetworkShard(resolver)
+        right._add_dangling('m1', 'b', attrs)
+        network = Network(resolver, backend=AdjacencyBackend())
+        network.merge(left.state())
+        assert 'm1' in network.dangling, network.dangling
+        network.merge(right.state())
+        assert not len(network.dangling), network.dangling
+        assert network.edge_ids == set(['m1'])
+        assert list(network.backend.iter_edges()) == [('b', 'a', attrs)]
+
+        # An entry without a source is replaced once the source is known:
+        shard = NetworkShard(resolver)
+        shard._add_dangling('m2', None, attrs)
+        shard._add_dangling('m2', 'a', attrs)
+        assert shard.dangling['m2'] == ('a', attrs), shard.dangling
+        shard._add_dangling('m2', 'b', attrs)
+        assert shard.edge_ids == set(['m2']), shard.edge_ids
+
+    def test_dangling_not_kept(self):
+        obj = {'$schema': 'http://www.popoloproject.com/schemas/person.json#',
+               'id': 'p1', 'memberships': [{'id': 'm1', 'role': 'Member'}]}
+        shard = NetworkShard(resolver)
+        shard.add(obj)
+        assert shard.dangling['m1'][0] == 'p1', shard.dangling
+        network = Network(resolver)
+        network.add(obj)
+        assert not len(network.dangling), network.dangling
+
+    def test_add_parallel(self):
+        objs = list(csv_mapper(self.csvobj, self.mapping, resolver=resolver))
+        network = Network(resolver, backend=AdjacencyBackend())
+        network.add_many(objs)
+        parallel = Network(resolver, backend=AdjacencyBackend())
+        parallel.add_parallel(objs, workers=2, chunksize=10)
+        assert parallel.edge_ids == network.edge_ids
+        assert parallel.backend.nodes == network.backend.nodes
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unicodecsv
+from unittest import TestCase
+from nose.tools import raises
+
+from jsonmapping import Mapper, StatementsVisitor
+from jsonmapping.snapshot import save_snapshot, load_snapshot, snapshot_key
+from .util import resolver, fixture_uri, fixture_file
+
+PERSON_URI = 'http://www.popoloproject.com/schemas/person.json#'
+
+
+class SnapshotTestCase(TestCase):
+
+    def setUp(self):
+        super(SnapshotTestCase, self).setUp()
+        self.mapping, uri = fixture_uri('everypol/mapping.json')
+        resolver.store[uri] = self.mapping
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'mapping.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_mapper_snapshot(self):
+        key = save_snapshot(self.path, resolver, mapping=self.mapping)
+        assert key == snapshot_key(resolver, mapping=self.mapping)
+        mapper = Mapper.from_snapshot(self.path, key=key)
+        assert mapper.visitor.resolver is None
+        csvobj = fixture_file('everypol/term-26.csv')
+        rows = list(unicodecsv.DictReader(csvobj))
+        expected = Mapper(self.mapping, resolver)
+        for row in rows[:20]:
+            assert mapper.apply(row) == expected.apply(row), row
+        mapped = list(mapper.compile().apply_iter(rows))
+        assert len(mapped) == len(rows), len(mapped)
+
+    def test_visitor_snapshot(self):
+        save_snapshot(self.path, resolver, schemas=[PERSON_URI])
+        sv = StatementsVisitor.from_snapshot(self.path, PERSON_URI)
+        data = {
+            'id': 'the-count',
+            'name': 'The Count',
+            'memberships': [{
+                'id': 'counting',
+                'organization': {'id': 'beans', 'name': 'Beans'}
+            }]
+        }
+        expected = StatementsVisitor({'$ref': PERSON_URI}, resolver)
+        assert sorted(sv.triplify(data)) == sorted(expected.triplify(data))
+
+    def test_attach_resolver(self):
+        save_snapshot(self.path, resolver, schemas=[PERSON_URI], depth=1)
+        snapshot = load_snapshot(self.path, resolver=resolver)
+        sv = snapshot.visitors[PERSON_URI]
+        assert sv.resolver is resolver
+        assert len(sv.get_property('memberships').items.properties)
+
+    @raises(ValueError)
+    def test_stale_snapshot(self):
+        save_snapshot(self.path, resolver, mapping=self.mapping)
+        load_snapshot(self.path, key='outdated')
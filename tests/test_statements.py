@@ -1,6 +1,9 @@
-from unittest import TestCase
+import pickle
+from unittest import TestCase, SkipTest
 
-from jsonmapping import StatementsVisitor
+from jsonmapping import StatementsVisitor, SchemaVisitor
+from jsonmapping.visitor import visitors, SchemaView
+from jsonmapping.util import content_hash, ASYNC_SUPPORTED
 
 from .util import resolver, fixture_uri
 
@@ -88,3 +91,164 @@ class StatementsTestCase(TestCase):
         oname = obj['memberships'][0]['organization']['name']
         dname = obj['memberships'][0]['organization']['name']
         assert oname == dname, obj
+
+    def test_cached_visitor(self):
+        sv = StatementsVisitor.cached(self.schema, resolver)
+        assert sv is StatementsVisitor.cached(self.schema, resolver)
+        assert sv is not SchemaVisitor.cached(self.schema, resolver)
+        visitors.invalidate(resolver)
+        assert sv is not StatementsVisitor.cached(self.schema, resolver)
+
+    def test_visitor_slots(self):
+        sv = StatementsVisitor(self.schema, resolver)
+        assert not hasattr(sv, '__dict__')
+        prop = sv.get_property('memberships').items
+        assert prop.path.endswith('membership.json#'), prop.path
+        assert prop.graph == 'edge', prop.graph
+        name = sv.get_property('name')
+        assert name.path == sv.path + '/name', name.path
+        assert name.title == 'name', name.title
+        assert name.inline is True
+
+    def test_schema_view(self):
+        referring = {'$ref': 'person.json#', 'title': 'Member', 'x': 1}
+        resolved = {'id': 'person.json#', 'title': 'Person'}
+        view = SchemaView(resolved, referring)
+        assert view['title'] == 'Person', view['title']
+        assert view.get('x') == 1, view.get('x')
+        assert '$ref' not in view
+        assert view.get('$ref') is None
+        assert dict(view) == {'id': 'person.json#', 'title': 'Person',
+                              'x': 1}, dict(view)
+        assert content_hash(view) == content_hash(dict(view))
+        copy = pickle.loads(pickle.dumps(view, 2))
+        assert dict(copy) == dict(view)
+        assert '$ref' in referring, referring
+
+    def test_triplify_batches(self):
+        sv = StatementsVisitor(self.schema, resolver)
+        data = {
+            'id': 'the-count',
+            'name': 'The Count',
+            'memberships': [{
+                'id': 'counting',
+                'role': 'Counter',
+                'organization': {
+                    'id': 'beans',
+                    'name': 'Beans'
+                }
+            }]
+        }
+        stmts = list(sv.triplify(data))
+        batches = list(sv.triplify_batches([data, data], batch_size=4))
+        assert len(stmts) == 11, len(stmts)
+        assert [len(b) for b in batches] == [4, 4, 4, 4, 4, 2], batches
+        assert sum(batches, []) == stmts + stmts, batches
+        batches = list(sv.triplify_batches([data, data], unique_types=True))
+        assert len(batches) == 1, batches
+        types = [s for s in batches[0] if s[1] == '$schema']
+        assert len(types) == 3, types
+        assert len(batches[0]) == len(stmts) * 2 - 3, batches[0]
+        subjects, _, _, _ = list(sv.triplify_batches([data],
+                                                     columns=True))[0]
+        assert subjects == [s for (s, _, _, _) in stmts], subjects
+
+    def test_objectify_provenance(self):
+        sv = StatementsVisitor(self.schema, resolver)
+        stmts = [
+            {'predicate': 'name', 'object': 'The Count', 'type': 'string',
+             'source': 'b', 'author': 'x'},
+            {'predicate': 'name', 'object': 'Count', 'type': 'string',
+             'source': 'a', 'author': 'x'},
+            {'predicate': 'foo', 'object': 'bar', 'type': 'string',
+             'source': 'c'},
+            {'predicate': 'gender', 'object': 'male', 'type': 'string',
+             'source': 'b', 'collection': 'y'}
+        ]
+        obj = sv.objectify(lambda node: stmts, 'the-count')
+        assert obj['$sources'] == ['b', 'a'], obj
+        assert obj['$authors'] == ['x'], obj
+        assert obj['$collections'] == ['y'], obj
+        assert obj['$attrcount'] == 2, obj
+        assert sv.get_property('name').name == 'name'
+        assert sv.get_property('foo') is None
+
+    def test_objectify_many(self):
+        sv = StatementsVisitor(self.schema, resolver)
+        data = {
+            'id': 'the-count',
+            'name': 'The Count',
+            'memberships': [{
+                'role': 'Counter',
+                'organization': {
+                    'id': 'beans',
+                    'name': 'Beans'
+                }
+            }]
+        }
+        stmts = list(sv.triplify(data))
+        loader = load_maker(stmts)
+        calls = []
+
+        def load_many(nodes):
+            calls.append(nodes)
+            return dict((n, list(loader(n))) for n in nodes)
+
+        objs = sv.objectify_many(load_many, [data['id'], 'beans'], depth=4)
+        assert objs[0] == sv.objectify(loader, data['id'], depth=4), objs
+        # The organization is loaded as a root already:
+        assert len(calls) == 2, calls
+        assert len(calls[0]) == 2, calls
+        for nodes in calls:
+            assert len(nodes) == len(set(nodes)), calls
+
+    def test_objectify_async(self):
+        if not ASYNC_SUPPORTED:
+            raise SkipTest('asyncio support requires Python 3.6')
+        import asyncio
+        sv = StatementsVisitor(self.schema, resolver)
+        data = {'id': 'the-count', 'name': 'The Count'}
+        loader = load_maker(list(sv.triplify(data)))
+        loop = asyncio.new_event_loop()
+
+        def load_many(nodes):
+            future = loop.create_future()
+            future.set_result(dict((n, loader(n)) for n in nodes))
+            return future
+
+        try:
+            obj = loop.run_until_complete(sv.objectify_async(load_many,
+                                                             'the-count'))
+        finally:
+            loop.close()
+        assert obj['name'] == 'The Count', obj
+
+    def test_stable_subjects(self):
+        class StableVisitor(StatementsVisitor):
+            stable_subjects = True
+
+        sv = StableVisitor(self.schema, resolver)
+        data = {
+            'id': 'the-count',
+            'memberships': [{'role': 'Counter'}, {'role': 'Sleeper'}]
+        }
+        stmts = list(sv.triplify(data))
+        assert stmts == list(sv.triplify(data)), stmts
+        subjects = set([s for (s, _, _, _) in stmts])
+        assert len(subjects) == 3, subjects
+
+        schema = {
+            'type': 'object',
+            'rdfSubjectFields': ['name'],
+            'properties': {
+                'name': {'type': 'string'},
+                'note': {'type': 'string'}
+            }
+        }
+        sv = StatementsVisitor(schema, resolver)
+        subject = sv.get_subject({'name': 'Beans', 'note': 'a'})
+        assert subject.startswith('urn:uuid:'), subject
+        assert subject == sv.get_subject({'name': 'Beans', 'note': 'b'})
+        assert subject != sv.get_subject({'name': 'Bean'})
+        # Objects without any subject field are not merged:
+        assert sv.get_subject({'note': 'a'}) != sv.get_subject({'note': 'a'})